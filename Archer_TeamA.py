@@ -2,6 +2,7 @@ import pygame
 from pygame import Vector2, Surface
 from random import randint, random, choices as random_choices, choice as random_choice
 from Graph import *
+from Globals import HIERARCHICAL_PATHFINDING
 
 from Character import *
 from State import *
@@ -16,20 +17,35 @@ def get_attackers(entity):
          by distance to the given entity
     """
     world = entity.world
-    attackers = [
-        e
-        for e in world.entities.values()
-        if (
+    attackers = world.spatial_hash.query(
+        entity.position,
+        entity.min_target_distance,
+        lambda e: (
             getattr(e, "target", None) is not None
             and e.target.id == entity.id
             and (e.position - entity.position).length() < entity.min_target_distance
-        )
-    ]
+        ),
+        # projectiles & explosions have no target
+        [p for p in world.get_partitions() if p[1] not in TRANSIENT_KINDS],
+    )
     return sorted(
         attackers, key=(lambda attacker: (attacker.position - entity.position).length())
     )
 
 
+def find_path(archer, start_node, end_node):
+    """
+    Find a path between the given nodes of the archer's interpolated graph.
+    Plans on the world graph before refining on the interpolated graph if
+    HIERARCHICAL_PATHFINDING is enabled, otherwise searches with A*.
+    """
+    if HIERARCHICAL_PATHFINDING:
+        return pathFindHierarchical(
+            archer.world.graph, archer.graph, start_node, end_node
+        )
+    return pathFindAStar(archer.graph, start_node, end_node)
+
+
 class Archer_TeamA(Character):
     def __init__(self, world, image, projectile_image, base, position):
 
@@ -48,7 +64,7 @@ class Archer_TeamA(Character):
         self.projectile_range = 100
         self.projectile_speed = 100
 
-        self.graph = interpolate_graph(self.world.graph)
+        self.graph = self.world.get_interpolated_graph(self.world.graph)
         # choose a random starting node, ultimately deciding the path taken
         starting_nodes = [
             self.world.graph.nodes[2],
@@ -164,8 +180,8 @@ class ArcherStateSeeking_TeamA(State):
             # continue navigating to enemy base via nearest node
             start_node = self.archer.graph.get_nearest_node(self.archer.position)
 
-        self.path = pathFindAStar(
-            self.archer.graph,
+        self.path = find_path(
+            self.archer,
             start_node,
             self.archer.graph.nodes[base.target_node_index],
         )
@@ -235,11 +251,18 @@ class ArcherStateCombat_TeamA(State):
             # seek opponent if out of ranged
             move_pos = projected_pos
         elif opponent_dist < safe_dist:
-            # move retreat to attack at a safe distance.
+            # move retreat to attack at a safe distance,
+            # preferring points in sight of the opponent to keep attacking from.
+            in_sight_pts = [
+                n.position for n in self.visibility.visible_from(opponent.position)
+            ]
+            is_safe = lambda pt: (pt - opponent.position).length() >= safe_dist
             _, move_pos = find_closest_point(
-                points=self.path_pts,
+                points=in_sight_pts
+                if any(map(is_safe, in_sight_pts))
+                else self.path_pts,
                 position=current_pos,
-                predicate=(lambda pt: (pt - opponent.position).length() >= safe_dist),
+                predicate=is_safe,
             )
         self.archer.move_target.position = move_pos
         self.archer.velocity = seek(self.archer, self.archer.move_target.position)
@@ -266,6 +289,8 @@ class ArcherStateCombat_TeamA(State):
     def entry_actions(self):
         # compile a list of unordered position/points of each node in the graph
         self.path_pts = [n.position for n in self.archer.graph.nodes.values()]
+        # which nodes of the graph see each other, precomputed as the world was created
+        self.visibility = self.archer.world.get_visibility_matrix(self.archer.graph)
         return None
 
 
@@ -298,8 +323,8 @@ class ArcherStateSearching_TeamA(State):
         search_node = graph.get_nearest_node(opponent.position)
         if nearest_node.id != search_node.id:
             # use a-star to find route to target when multi node traversal is required
-            connections = pathFindAStar(
-                graph,
+            connections = find_path(
+                self.archer,
                 nearest_node,
                 search_node,
             )
@@ -2,9 +2,19 @@ from Globals import *
 
 from GameEntity import *
 from Projectile import *
+from Kinematics import KinematicField
+from render_resources import get_font, render_text
 
 
 class Character(GameEntity):
+
+    # views into the world's kinematic store, see GameEntity.kinematic_slot
+    current_melee_cooldown = KinematicField()
+    current_ranged_cooldown = KinematicField()
+    current_healing_cooldown = KinematicField()
+    current_respawn_time = KinematicField()
+    ko = KinematicField()
+
     def __init__(self, world, name, image, respawnable=True):
 
         GameEntity.__init__(self, world, name, image)
@@ -76,7 +86,9 @@ class Character(GameEntity):
                 self.world.remove_entity(self)
                 return
 
-        # update cooldown timers
+        # update cooldown timers, unless counted down by the world's kinematic store
+        if self.world.kinematics is not None:
+            return
 
         # --- PATCH 2021-12-14 ---------------------------------
         #   Healing cooldown now on top of melee/ranged cooldown
@@ -171,8 +183,10 @@ class Character(GameEntity):
 
         # --- Visual feedback on level up ---
         if self.level_up_message:
-            font = pygame.font.SysFont("comicsansms", 18, True)
-            msg = font.render("+" + self.level_up_message, True, (255, 255, 255))
+            font = get_font("comicsansms", 18, True)
+            msg = render_text(
+                "+" + self.level_up_message, (255, 255, 255), "comicsansms", 18, True
+            )
             w, h = font.size("+" + self.level_up_message)
             surface.blit(
                 msg,
@@ -185,9 +199,8 @@ class Character(GameEntity):
 
         # --- If DEBUG is on, shows min_target_distance and target ---
         if DEBUG and self.name == "archer" and self.team_id == 0:
-            font = pygame.font.SysFont("arial", 12, True)
-            state_name = font.render(
-                self.brain.active_state.name, True, (255, 255, 255)
+            state_name = render_text(
+                self.brain.active_state.name, (255, 255, 255), "arial", 12, True
             )
             surface.blit(state_name, self.position)
 
@@ -196,6 +209,34 @@ class Character(GameEntity):
                     surface, (0, 255, 0), self.position, self.target.position
                 )
 
+    def get_render_state(self):
+
+        return GameEntity.get_render_state(self) + (
+            self.ko,
+            self.level_up_message,
+            self.level_up_y,
+        )
+
+    def get_render_rect(self):
+
+        rects = []
+        if not self.ko:
+            rects.append(GameEntity.get_render_rect(self))
+        if self.level_up_message:
+            w, h = get_font("comicsansms", 18, True).size("+" + self.level_up_message)
+            rects.append(
+                pygame.Rect(
+                    self.position[0] - w / 2,
+                    self.position[1] - h / 2 - self.level_up_y,
+                    w,
+                    h,
+                ).inflate(4, 4)
+            )
+
+        if not rects:
+            return None
+        return rects[0].unionall(rects[1:])
+
     def can_level_up(self):
         return self.xp >= self.xp_to_next_level
 
@@ -5,6 +5,8 @@ from math import *
 from pygame.math import *
 from Globals import *
 from StateMachine import *
+from Kinematics import KinematicField
+from render_resources import get_rotated, quantize_orientation
 
 
 # ----------------------------------------------------
@@ -12,6 +14,15 @@ from StateMachine import *
 #   If show_hp is True, then a life bar will be shown
 # ----------------------------------------------------
 class GameEntity(pygame.sprite.Sprite):
+
+    # grid cell of the entity in the world's spatial hash, None if not in the world
+    spatial_cell = None
+    # grid cells of the entity's rect in the world's rect grid, None if not in the grid
+    rect_cells = None
+    # slot of the entity in the world's kinematic store, None if not in the store
+    kinematic_slot = None
+    current_hp = KinematicField()
+
     def __init__(self, world, name, image, show_hp=True):
 
         pygame.sprite.Sprite.__init__(self)
@@ -40,10 +51,23 @@ class GameEntity(pygame.sprite.Sprite):
         self.max_hp = 100.0
         self.current_hp = self.max_hp
 
+    # --- position of the entity, kept up to date in the world's spatial hash ---
+    @property
+    def position(self):
+
+        return self._position
+
+    @position.setter
+    def position(self, position):
+
+        self._position = position
+        if self.spatial_cell is not None:
+            self.world.move_entity(self)
+
     def render(self, surface):
 
         x, y = self.position
-        rotated_image = pygame.transform.rotate(self.image, self.orientation)
+        rotated_image = get_rotated(self.image, self.orientation)
         w, h = rotated_image.get_size()
         draw_pos = Vector2(self.position.x - w / 2, self.position.y - h / 2)
 
@@ -58,43 +82,59 @@ class GameEntity(pygame.sprite.Sprite):
                 (0, 255, 0), (bar_x, bar_y, (self.current_hp / self.max_hp) * w, 4)
             )
 
-    def process(self, time_passed):
+    # --- returns what render() draws the entity with, changing when its drawing changes ---
+    def get_render_state(self):
 
-        self.brain.think()
+        return (
+            self.image,
+            quantize_orientation(self.orientation),
+            (self.position[0], self.position[1]),
+            (self.current_hp, self.max_hp) if self.show_hp else None,
+        )
 
-        # update position
-        self.position += self.velocity * time_passed
+    # --- returns the screen area render() draws in, or None if it draws nothing ---
+    def get_render_rect(self):
 
-        w, h = self.image.get_size()
-        self.rect.x = self.position[0] - w / 2
-        self.rect.y = self.position[1] - h / 2
+        w, h = get_rotated(self.image, self.orientation).get_size()
+        rect = pygame.Rect(
+            self.position[0] - w / 2,
+            self.position[1] - h / 2,
+            w,
+            h + 4 if self.show_hp else h,
+        )
+        # pad to cover drawing at fractional positions
+        return rect.inflate(4, 4)
 
-        # detect edge of screen
-        if (
-            self.position[0] < 0
-            or self.position[0] > SCREEN_WIDTH
-            or self.position[1] < 0
-            or self.position[1] > SCREEN_HEIGHT
-        ):
-            if self.name == "projectile":
-                self.world.remove_entity(self)
-            else:
-                self.position -= self.velocity * time_passed
+    def process(self, time_passed):
+
+        # with a kinematic store, the world thinks & moves every entity beforehand
+        if self.world.kinematics is None:
+            self.brain.think()
+
+            # update position
+            self.position += self.velocity * time_passed
+            self.sync_rect(self.position)
+
+            # detect edge of screen
+            if (
+                self.position[0] < 0
+                or self.position[0] > SCREEN_WIDTH
+                or self.position[1] < 0
+                or self.position[1] > SCREEN_HEIGHT
+            ):
+                if self.name == "projectile":
+                    self.world.remove_entity(self)
+                else:
+                    self.position -= self.velocity * time_passed
 
         # --- PATCH 2021-12-14 --------------------------
         #   Made bases an obstacle
         #       to remove exploit of hiding behind a base
         # -----------------------------------------------
 
-        # check if colliding with obstacle or base
-        collision_list = pygame.sprite.spritecollide(
-            self, self.world.obstacles, False, pygame.sprite.collide_mask
-        )
-        for entity in collision_list:
-            if entity.team_id == self.team_id:
-                continue
-            elif entity.name == "obstacle" or entity.name == "base":
-                self.position -= self.velocity * time_passed
+        # check if colliding with obstacle or base, moving back once for each
+        for _ in range(self.world.occupancy.count_overlapping(self)):
+            self.position -= self.velocity * time_passed
 
         # update orientation if projectile
         if self.name == "projectile":
@@ -102,6 +142,31 @@ class GameEntity(pygame.sprite.Sprite):
                 self.getNewOrientation(self.orientation, self.velocity) % 360
             )
 
+    # --- centers the entity's rect on the given position, keeping the world's rect grid up to date ---
+    def sync_rect(self, position):
+
+        w, h = self.image.get_size()
+        self.rect.x = position[0] - w / 2
+        self.rect.y = position[1] - h / 2
+        if self.rect_cells is not None:
+            self.world.move_rect(self)
+
+    # --- applies a position integrated by the world's kinematic store ---
+    # undone is the position with the integration undone, taken if moved is off screen
+    def apply_kinematics(self, moved, undone, outside):
+
+        self.sync_rect(moved)
+
+        # detect edge of screen
+        if outside:
+            if self.name == "projectile":
+                self.position = Vector2(moved)
+                self.world.remove_entity(self)
+            else:
+                self.position = Vector2(undone)
+        else:
+            self.position = Vector2(moved)
+
     def getNewOrientation(self, currentOrientation, velocity):
 
         if velocity.length() > 0:
@@ -83,6 +83,56 @@ CAMERA = str(os.environ.get("CAMERA", default="NOPCamera"))
 # filepath to write the game recording video. Must end with '.mp4'
 RECORDING_PATH = str(os.environ.get("RECORDING_PATH", "hal.mp4"))
 
+# render the game every RENDER_EVERY frames, or never if set to 0.
+# the camera only records rendered frames, so recordings skip the frames in between.
+RENDER_EVERY = int(os.environ.get("RENDER_EVERY", default=1))
+
+# whether to render only the areas of the screen that changed since the last render.
+# renders in full anyway when DEBUG or SHOW_PATHS is set.
+DIRTY_RENDERING = bool(strtobool(os.environ.get("DIRTY_RENDERING", default="False")))
+
+# max no. of paths searched for by A* or hierarchical pathfinding to cache for reuse.
+# Set to 0 to disable the path cache. Only graphs without precomputed routes, such as
+# interpolated graphs, are searched for paths to cache.
+# the path cache hits & misses are reported at the end of the game, with the no. of paths
+# answered by precomputed routes instead, which never reach the cache.
+PATH_CACHE_SIZE = int(os.environ.get("PATH_CACHE_SIZE", default=0))
+
+# compiled binary bundle of the map's pathfinding graph & obstacle paths, built by 'make map'.
+# the text map files are parsed instead if the bundle is missing or out of date.
+MAP_BUNDLE_PATH = str(os.environ.get("MAP_BUNDLE_PATH", "map_bundle.npz"))
+
+# manifest of the sprites used by the game
+ASSET_MANIFEST_PATH = str(os.environ.get("ASSET_MANIFEST_PATH", "assets/manifest.json"))
+# atlas of the manifest's sprites as raw pixels, built by 'make atlas'.
+# the sprites' image files are loaded instead if the atlas is missing or out of date.
+SPRITE_ATLAS_PATH = str(os.environ.get("SPRITE_ATLAS_PATH", "sprite_atlas.npz"))
+
+# whether Team A's Archer plans paths on the world graph before refining them on its
+# interpolated graph, instead of searching the interpolated graph end to end with A*.
+HIERARCHICAL_PATHFINDING = bool(
+    strtobool(os.environ.get("HIERARCHICAL_PATHFINDING", default="False"))
+)
+
+# whether World caches every entity's nearest opponents once per frame with a NumPy
+# distance matrix, instead of searching the spatial hash for each query.
+# both give identical results: disable to compare their performance.
+NEAREST_OPPONENT_CACHE = bool(
+    strtobool(os.environ.get("NEAREST_OPPONENT_CACHE", default="True"))
+)
+# whether World keeps entities' kinematic state in a structure of arrays, processing
+# each frame in phases: every entity thinks, then positions & cooldowns of every
+# entity are stepped with NumPy, then every entity resolves collisions & the rest.
+# entities think on the positions at the start of the frame, so games play out
+# differently from the default, where each entity thinks & moves in turn.
+SOA_KINEMATICS = bool(strtobool(os.environ.get("SOA_KINEMATICS", default="False")))
+# whether line of sight checks against obstacles are cached, reusing each entry
+# until the observer or target moves further than LOS_CACHE_TOLERANCE pixels.
+# a tolerance of 0 gives identical results to casting every ray.
+# the line of sight cache hits & misses are reported at the end of the game.
+LOS_CACHE = bool(strtobool(os.environ.get("LOS_CACHE", default="True")))
+LOS_CACHE_TOLERANCE = float(os.environ.get("LOS_CACHE_TOLERANCE", default=0))
+
 ## Game Settings
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
@@ -91,6 +141,24 @@ SCREEN_SIZE = (SCREEN_WIDTH, SCREEN_HEIGHT)
 TIME_LIMIT = 180 * 1 / SPEED_MULTIPLIER
 
 TEAM_NAME = str(os.environ.get("TEAM_NAME", default="TeamA,TeamB")).split(",")
+# team id of neutral entities, eg. obstacles & the grey tower
+NEUTRAL_TEAM_ID = 2
+
+# kinds of entity that World keeps registries of, by entity name.
+# entities with other names are registered as "other"
+ENTITY_KINDS = {
+    "knight": "heroes",
+    "archer": "heroes",
+    "wizard": "heroes",
+    "orc": "orcs",
+    "base": "buildings",
+    "tower": "buildings",
+    "projectile": "projectiles",
+    "explosion": "explosions",
+    "obstacle": "obstacles",
+}
+# short lived entities that are never targeted as opponents
+TRANSIENT_KINDS = ("projectiles", "explosions")
 
 RESPAWN_TIME = 5.0 * 1 / SPEED_MULTIPLIER
 HEALING_COOLDOWN = 2.0 * 1 / SPEED_MULTIPLIER
@@ -159,6 +227,8 @@ UP_PERCENTAGE_HEALING = 20
 UP_PERCENTAGE_HEALING_COOLDOWN = 10
 
 FINAL_SCORE_HEADER = "Final Score:"
+PATH_CACHE_HEADER = "Path Cache:"
+LOS_CACHE_HEADER = "Line of Sight Cache:"
 
 PARAMS = {
     "debug": DEBUG,
@@ -174,6 +244,14 @@ PARAMS = {
     "team_names": TEAM_NAME,
     "logger": LOGGER,
     "camera": CAMERA,
+    "render_every": RENDER_EVERY,
+    "dirty_rendering": DIRTY_RENDERING,
+    "path_cache_size": PATH_CACHE_SIZE,
+    "hierarchical_pathfinding": HIERARCHICAL_PATHFINDING,
+    "nearest_opponent_cache": NEAREST_OPPONENT_CACHE,
+    "soa_kinematics": SOA_KINEMATICS,
+    "los_cache": LOS_CACHE,
+    "los_cache_tolerance": LOS_CACHE_TOLERANCE,
     # assume team red is opponent
     "opponent": TEAM_NAME[-1],
     "rng_seed": RANDOM_SEED,
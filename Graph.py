@@ -1,38 +1,273 @@
+import heapq
 import pygame
+from array import array
+from collections import OrderedDict
+import numpy as np
+from math import sqrt
 from pygame.math import *
 
+from Globals import PATH_CACHE_SIZE
+
 
 class Graph(object):
     def __init__(self, world):
 
         self.world = world
 
-        self.connections = []  # an unordered list of connections
+        # compact storage of the graph: Node & Connection objects are views into these arrays.
+        # nodes are numbered in the order they are added to, created in or connected in the graph
+        self.numbers = {}  # node numbers, indexed by node.id
+        self.views = []  # node objects, indexed by node number
+        self.coords = array("d")  # x & y coordinates of each node, interleaved
+        # connections are numbered in the order they were added
+        self.sources = array("i")  # from node number of each connection
+        self.targets = array("i")  # to node number of each connection
+        self.costs = array("d")  # cost of each connection
+        # list of connection views, built lazily by the connections property
+        self.connectionViews = None
+
+        # all pairs shortest routes, indexed by [toNode.id][fromNode.id].
+        # only set for graphs that are precomputed with precomputeRoutes()
+        self.routeNext = None  # first connection on the route
+        self.routeCosts = None  # total cost of the route
+
+        # spatial index of node positions, built lazily by get_nearest_node()
+        self.nodeIndex = None
+
+        # connection indexes for searches, built lazily by getCompact()
+        self.compact = None
+
+        # flow fields towards goal nodes, indexed by goal node.id, built lazily by getFlowField()
+        self.flowFields = {}
+
+        # incremented whenever nodes or connections change
+        self.version = 0
+
         self.nodes = {}  # dictionary of nodes, indexed by node.id
 
+    # dictionary of nodes, indexed by node.id.
+    # assigning a plain dict wraps it so that the graph is notified of changes to its nodes
+    @property
+    def nodes(self):
+
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+
+        self._nodes = NodeDict(self, nodes)
+        self.nodesChanged()
+
+    # called when nodes are added or removed from the graph
+    def nodesChanged(self):
+
+        self.nodeIndex = None
+        self.connectionsChanged()
+
+    # called when connections are added to the graph
+    def connectionsChanged(self):
+
+        # precomputed routes & cached paths no longer reflect the graph
+        self.connectionViews = None
+        self.compact = None
+        self.flowFields = {}
+        self.routeNext = None
+        self.routeCosts = None
+        self.version += 1
+
+    # an unordered list of connections, as views shared until the graph changes: do not modify
+    @property
+    def connections(self):
+
+        if self.connectionViews is None:
+            self.connectionViews = [
+                Connection(self, number) for number in range(len(self.costs))
+            ]
+
+        return self.connectionViews
+
+    # returns the number of the given node, storing the node if it is new to the graph
+    def numberOf(self, node):
+
+        number = self.numbers.get(node.id)
+        if number is None:
+            number = self.storeNode(node, node.id, *node.position)
+
+        return number
+
+    # stores the given node's id & coordinates, returning its number
+    def storeNode(self, node, id, x, y):
+
+        number = self.numbers.get(id)
+        if number is None:
+            number = len(self.views)
+            self.numbers[id] = number
+            self.views.append(node)
+            self.coords.extend((0, 0))
+        else:
+            self.views[number] = node
+
+        self.coords[2 * number] = x
+        self.coords[2 * number + 1] = y
+        self.connectionsChanged()
+
+        return number
+
+    # returns the connection indexes of the graph, rebuilt if the graph has changed
+    def getCompact(self):
+
+        if self.compact is None:
+            self.compact = CompactGraph(self)
+
+        return self.compact
+
+    # returns a copy of the graph with nodes inserted along every connection each intervalDist.
+    # nodes of the original graph are shared with the copy
+    def interpolate(self, intervalDist):
+
+        graph = Graph(self.world)
+        graph.nodes = dict(self.nodes)
+        nextId = max(self.nodes) + 1
+        if not self.connections:
+            return graph
+
+        # no. of intervals along each connection
+        starts = np.array(
+            [con.fromNode.position for con in self.connections], dtype=np.float64
+        )
+        ends = np.array(
+            [con.toNode.position for con in self.connections], dtype=np.float64
+        )
+        nIntervals = [
+            int(
+                (Vector2(con.toNode.position) - Vector2(con.fromNode.position)).length()
+                // intervalDist
+            )
+            for con in self.connections
+        ]
+
+        # positions of the points inserted between (exclusive of) the start & end of each connection,
+        # lerped like Vector2.lerp() & truncated to integers
+        counts = np.array([max(n - 1, 0) for n in nIntervals])
+        conIndex = np.repeat(np.arange(len(self.connections)), counts)
+        steps = (
+            np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        )
+        t = (steps / np.array(nIntervals)[conIndex])[:, np.newaxis]
+        points = np.trunc(starts[conIndex] * (1 - t) + ends[conIndex] * t).astype(
+            np.int64
+        )
+
+        # cost of the segment leading to each point, from the previous point or connection start
+        prev = np.where(
+            (steps == 1)[:, np.newaxis], starts[conIndex], np.roll(points, 1, axis=0)
+        )
+        disp = points - prev
+        costs = np.sqrt(disp[:, 0] * disp[:, 0] + disp[:, 1] * disp[:, 1]).tolist()
+
+        points = points.tolist()
+        iPoint = 0
+        for con, count in zip(self.connections, counts.tolist()):
+            prevNode = con.fromNode
+            for _ in range(count):
+                node = Node(graph, nextId, points[iPoint][0], points[iPoint][1])
+                graph.nodes[nextId] = node
+                graph.addConnection(prevNode, node, costs[iPoint])
+                prevNode = node
+                nextId += 1
+                iPoint += 1
+
+            # the segment into the end node is given no cost when points were inserted,
+            # which pathfinding on interpolated graphs has always relied on
+            if count > 0:
+                cost = 0.0
+            else:
+                cost = (
+                    Vector2(con.toNode.position) - Vector2(con.fromNode.position)
+                ).length()
+            graph.addConnection(prevNode, con.toNode, cost)
+
+        return graph
+
+    # returns the flow field towards the given goal node, computed once per goal
+    def getFlowField(self, goal):
+
+        if goal.id not in self.flowFields:
+            self.flowFields[goal.id] = FlowField(self, goal)
+
+        return self.flowFields[goal.id]
+
     # returns the connections of from-node as an unordered list
     def getConnections(self, fromNode):
 
-        cons = []
-        for con in self.connections:
-            if con.fromNode.id == fromNode.id:
-                cons.append(con)
+        number = self.numbers.get(fromNode.id)
+        if number is None:
+            return []
+        edges, _, _ = self.getCompact().outgoing.row(number)
 
-        return cons
+        return [Connection(self, edge) for edge in edges]
 
     # adds a connection
     def addConnection(self, fromNode, toNode, cost):
 
-        connection = Connection(self, cost, fromNode, toNode)
-        self.connections.append(connection)
+        self.sources.append(self.numberOf(fromNode))
+        self.targets.append(self.numberOf(toNode))
+        self.costs.append(cost)
+        self.connectionsChanged()
+
+    # precomputes the shortest route between every pair of nodes.
+    # only worthwhile for graphs that do not change after they are built
+    def precomputeRoutes(self):
+
+        routeNext, routeCosts = {}, {}
+        for node in self.nodes.values():
+            routeNext[node.id], routeCosts[node.id] = shortestRoutesTo(self, node)
+
+        self.routeNext = routeNext
+        self.routeCosts = routeCosts
+
+    # returns True if the route between the given nodes has been precomputed
+    def hasRoute(self, fromNode, toNode):
+
+        return (
+            self.routeNext is not None
+            and toNode.id in self.routeNext
+            and fromNode.id in self.nodes
+        )
+
+    # returns the precomputed route between the given nodes as a list of connections
+    # or None if toNode cannot be reached from fromNode
+    def getRoute(self, fromNode, toNode):
+
+        routeNext = self.routeNext[toNode.id]
+        if fromNode.id != toNode.id and fromNode.id not in routeNext:
+            return None
+
+        path = []
+        nodeId = fromNode.id
+        while nodeId != toNode.id:
+            path.append(routeNext[nodeId])
+            nodeId = path[-1].toNode.id
+
+        return path
+
+    # returns the precomputed cost of the route between the given nodes
+    # or None if the route has not been precomputed or does not exist
+    def routeCost(self, fromNode, toNode):
+
+        if not self.hasRoute(fromNode, toNode):
+            return None
+
+        return self.routeCosts[toNode.id].get(fromNode.id)
 
     # returns True if this connection exists, False otherwise
     def hasConnection(self, fromNode, toNode):
-        for con in self.connections:
-            if con.fromNode.id == fromNode.id and con.toNode.id == toNode.id:
-                return True
+        number, toNumber = self.numbers.get(fromNode.id), self.numbers.get(toNode.id)
+        if number is None or toNumber is None:
+            return False
+        _, targets, _ = self.getCompact().outgoing.row(number)
 
-        return False
+        return toNumber in targets
 
     def render(self, surface):
 
@@ -47,48 +282,413 @@ class Graph(object):
             pygame.draw.circle(surface, (200, 255, 0), self.nodes[nodeKey].position, 5)
 
     # --- returns nearest node to given position ---
+    # if several nodes are equally near, the one added to the graph first is returned
     def get_nearest_node(self, position):
 
-        nearest = None
-        for node in self.nodes.values():
-            if nearest is None:
-                nearest = node
-                nearest_distance = (position - Vector2(nearest.position)).length()
+        nearest = self.get_nearest_nodes(position, 1)
+        return nearest[0] if nearest else None
+
+    # --- returns up to k nodes nearest to given position, nearest first ---
+    def get_nearest_nodes(self, position, k):
+
+        if self.nodeIndex is None:
+            self.nodeIndex = NodeIndex(self.nodes.values())
+
+        return self.nodeIndex.nearest(position, k)
+
+
+class NodeDict(dict):
+    # dictionary of nodes that notifies its graph when nodes are added or removed.
+    # nodes are numbered by the graph as they are added
+
+    def __init__(self, graph, *args, **kwargs):
+
+        dict.__init__(self, *args, **kwargs)
+        self.graph = graph
+        for node in self.values():
+            graph.numberOf(node)
+
+    def __setitem__(self, key, node):
+
+        dict.__setitem__(self, key, node)
+        self.graph.numberOf(node)
+        self.graph.nodesChanged()
+
+    def __delitem__(self, key):
+
+        dict.__delitem__(self, key)
+        self.graph.nodesChanged()
+
+    def pop(self, *args):
+
+        node = dict.pop(self, *args)
+        self.graph.nodesChanged()
+        return node
+
+    def popitem(self):
+
+        item = dict.popitem(self)
+        self.graph.nodesChanged()
+        return item
+
+    def clear(self):
+
+        dict.clear(self)
+        self.graph.nodesChanged()
+
+    def update(self, *args, **kwargs):
+
+        for key, node in dict(*args, **kwargs).items():
+            dict.__setitem__(self, key, node)
+            self.graph.numberOf(node)
+        self.graph.nodesChanged()
+
+    def setdefault(self, key, default=None):
+
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+class NodeIndex(object):
+    # uniform grid of node positions for nearest node queries
+
+    maxScanNodes = 32
+
+    def __init__(self, nodes):
+
+        # remember the order nodes were given in to break ties in distance
+        self.entries = [
+            (order, node, Vector2(node.position)) for order, node in enumerate(nodes)
+        ]
+
+        # size cells to hold about one node each
+        xs = [pos.x for _, _, pos in self.entries] or [0]
+        ys = [pos.y for _, _, pos in self.entries] or [0]
+        width, height = max(xs) - min(xs), max(ys) - min(ys)
+        n_nodes = max(len(self.entries), 1)
+        self.cellSize = max(
+            sqrt(width * height / n_nodes), max(width, height) / n_nodes, 1.0
+        )
+
+        self.cells = {}
+        for entry in self.entries:
+            self.cells.setdefault(self.cellOf(entry[2]), []).append(entry)
+
+        cellXs = [cx for cx, _ in self.cells] or [0]
+        cellYs = [cy for _, cy in self.cells] or [0]
+        self.minCell = (min(cellXs), min(cellYs))
+        self.maxCell = (max(cellXs), max(cellYs))
+
+    # returns the grid cell containing the given position
+    def cellOf(self, position):
+
+        return (
+            int(position[0] // self.cellSize),
+            int(position[1] // self.cellSize),
+        )
+
+    # returns the cells that are exactly ring cells away from the given cell
+    def ringCells(self, cell, ring):
+
+        (cx, cy), (minX, minY), (maxX, maxY) = cell, self.minCell, self.maxCell
+        for y in range(max(cy - ring, minY), min(cy + ring, maxY) + 1):
+            if abs(y - cy) == ring:
+                xs = range(max(cx - ring, minX), min(cx + ring, maxX) + 1)
             else:
-                distance = (position - Vector2(node.position)).length()
-                if distance < nearest_distance:
-                    nearest = node
-                    nearest_distance = distance
+                xs = [x for x in (cx - ring, cx + ring) if minX <= x <= maxX]
+
+            for x in xs:
+                if (x, y) in self.cells:
+                    yield self.cells[(x, y)]
+
+    # returns up to k nodes nearest to the given position, nearest first.
+    # equally near nodes are ordered by the order they were given in
+    def nearest(self, position, k):
+
+        if k <= 0:
+            return []
+
+        position = Vector2(position)
+
+        # scanning is faster than searching the grid for small graphs
+        if len(self.entries) <= NodeIndex.maxScanNodes:
+            nearest = [
+                ((position - nodePosition).length(), order, node)
+                for order, node, nodePosition in self.entries
+            ]
+            return [node for _, _, node in heapq.nsmallest(k, nearest)]
+
+        cell = self.cellOf(position)
+        maxRing = max(
+            abs(cell[0] - self.minCell[0]),
+            abs(cell[0] - self.maxCell[0]),
+            abs(cell[1] - self.minCell[1]),
+            abs(cell[1] - self.maxCell[1]),
+        )
+
+        nearest = []
+        for ring in range(maxRing + 1):
+            for entries in self.ringCells(cell, ring):
+                for order, node, nodePosition in entries:
+                    nearest.append(((position - nodePosition).length(), order, node))
+            nearest = heapq.nsmallest(k, nearest)
+
+            # nodes outside the searched rings are at least ring cells away
+            if len(nearest) == k and nearest[-1][0] < ring * self.cellSize:
+                break
+
+        return [node for _, _, node in nearest]
+
+
+class PathCache(object):
+    # least recently used cache of paths searched for by pathFindAStar() & pathFindHierarchical(),
+    # indexed by graph identity, coarse graph identity, start node id & end node id.
+    # the coarse graph is None for paths found by pathFindAStar().
+    # routes precomputed by precomputeRoutes() are answered before the cache & never cached:
+    # they are only counted as routed, so hits & misses only count searched paths
+
+    def __init__(self, maxSize):
+
+        self.maxSize = maxSize
+        self.paths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.routed = 0
+
+    # returns the cached path between the given nodes or None on a cache miss
+    def get(self, graph, start, end, coarse=None):
+
+        key = (id(graph), id(coarse), start.id, end.id)
+        entry = self.paths.get(key)
+
+        # paths cached before the graph or coarse graph changed are stale
+        if (
+            entry is None
+            or entry[0] is not graph
+            or entry[1] != graph.version
+            or entry[2] is not coarse
+            or (coarse is not None and entry[3] != coarse.version)
+        ):
+            self.misses += 1
+            return None
+
+        self.paths.move_to_end(key)
+        self.hits += 1
+        return list(entry[4])
+
+    # caches the path between the given nodes, evicting the least recently used path if full
+    def put(self, graph, start, end, path, coarse=None):
+
+        key = (id(graph), id(coarse), start.id, end.id)
+        self.paths[key] = (
+            graph,
+            graph.version,
+            coarse,
+            None if coarse is None else coarse.version,
+            tuple(path),
+        )
+        self.paths.move_to_end(key)
+
+        while len(self.paths) > self.maxSize:
+            self.paths.popitem(last=False)
 
-        return nearest
+    def clear(self):
+
+        self.paths.clear()
+        self.hits = 0
+        self.misses = 0
+        self.routed = 0
+
+
+# path cache used by pathFindAStar() & pathFindHierarchical(), disabled if None
+pathCache = PathCache(PATH_CACHE_SIZE) if PATH_CACHE_SIZE > 0 else None
+
+
+# --- enables caching of paths searched for by pathFindAStar() & pathFindHierarchical(),
+# up to maxSize paths ---
+# disables the path cache if maxSize is 0
+def setPathCacheSize(maxSize):
+
+    global pathCache
+    pathCache = PathCache(maxSize) if maxSize > 0 else None
+
+
+# --- returns the path cache used by pathFindAStar() & pathFindHierarchical() or None if disabled ---
+def getPathCache():
+
+    return pathCache
+
+
+class ConnectionIndex(object):
+    # compressed sparse row (CSR) index of a graph's connections by node number:
+    # the connections of node i are the connection numbers edges[offsets[i] : offsets[i + 1]],
+    # joining node i to the node numbers neighbours[offsets[i] : offsets[i + 1]].
+    # outgoing connections are in the order they were added,
+    # incoming connections are ordered by from node number
+
+    def __init__(self, graph, incoming=False):
+
+        sources = np.array(graph.sources, dtype=np.int32)
+        targets = np.array(graph.targets, dtype=np.int32)
+        if incoming:
+            nodes, neighbours = targets, sources
+            order = np.lexsort((sources, targets))
+        else:
+            nodes, neighbours = sources, targets
+            order = np.argsort(sources, kind="stable")
+
+        # searches read one element at a time, which is faster from arrays than numpy arrays
+        offsets = np.searchsorted(nodes[order], np.arange(len(graph.views) + 1))
+        self.offsets = array("q", offsets.astype(np.int64).tobytes())
+        self.edges = array("i", order.astype(np.int32).tobytes())
+        self.neighbours = array("i", neighbours[order].tobytes())
+        self.costs = array(
+            "d", np.array(graph.costs, dtype=np.float64)[order].tobytes()
+        )
+
+    # returns the connection numbers, neighbour numbers & costs of the connections of node i
+    def row(self, i):
+
+        first, last = self.offsets[i], self.offsets[i + 1]
+        return (
+            self.edges[first:last],
+            self.neighbours[first:last],
+            self.costs[first:last],
+        )
+
+
+class CompactGraph(object):
+    # connection indexes of a graph for searches
+
+    def __init__(self, graph):
+
+        self.graph = graph
+        self.outgoing = ConnectionIndex(graph)
+        # incoming connections, built lazily by getIncoming()
+        self.incoming = None
+
+        # connection numbers refining coarse connections, filled by refineConnection()
+        self.refined = {}
+
+    # returns the index of incoming connections
+    def getIncoming(self):
+
+        if self.incoming is None:
+            self.incoming = ConnectionIndex(self.graph, incoming=True)
+
+        return self.incoming
+
+
+class FlowField(object):
+    # first connection & total cost of the shortest route from every node towards one goal node,
+    # indexed by node.id. taken from the graph's precomputed routes when available,
+    # otherwise computed by a single reverse dijkstra from the goal
+
+    def __init__(self, graph, goal):
+
+        self.graph = graph
+        self.goal = goal
+        if graph.routeNext is not None and goal.id in graph.routeNext:
+            self.routeNext = graph.routeNext[goal.id]
+            self.routeCosts = graph.routeCosts[goal.id]
+        else:
+            self.routeNext, self.routeCosts = shortestRoutesTo(graph, goal)
+
+    # returns the first connection on the route from node to the goal, None if there is none
+    def getNext(self, node):
+
+        return self.routeNext.get(node.id)
+
+    # returns the total cost of the route from node to the goal, None if there is no route
+    def getCost(self, node):
+
+        return self.routeCosts.get(node.id)
+
+    # returns the route from node to the goal as a list of connections, None if there is no route
+    def getPath(self, node):
+
+        if node.id != self.goal.id and node.id not in self.routeNext:
+            return None
+
+        path = []
+        nodeId = node.id
+        while nodeId != self.goal.id:
+            path.append(self.routeNext[nodeId])
+            nodeId = path[-1].toNode.id
+
+        return path
 
 
 class Connection(object):
-    def __init__(self, graph, cost, fromNode, toNode):
+    # view of a connection stored in its graph, by connection number
+    __slots__ = ("graph", "number")
+
+    def __init__(self, graph, number):
 
         self.graph = graph
-        self.cost = cost
-        self.fromNode = fromNode
-        self.toNode = toNode
+        self.number = number
+
+    @property
+    def cost(self):
+
+        return self.graph.costs[self.number]
+
+    @property
+    def fromNode(self):
+
+        return self.graph.views[self.graph.sources[self.number]]
+
+    @property
+    def toNode(self):
+
+        return self.graph.views[self.graph.targets[self.number]]
+
+    # views of the same connection are equal
+    def __eq__(self, other):
+
+        return (
+            isinstance(other, Connection)
+            and self.graph is other.graph
+            and self.number == other.number
+        )
+
+    def __hash__(self):
+
+        return hash((id(self.graph), self.number))
 
 
 class Node(object):
+    # view of a node stored in the graph it was created in, by node number
+    __slots__ = ("id", "graph", "number")
+
     def __init__(self, graph, id, x, y):
 
         self.id = id
         self.graph = graph
-        self.position = (x, y)
-        self.connections = []
+        self.number = graph.storeNode(self, id, x, y)
+
+    @property
+    def position(self):
+
+        coords, number = self.graph.coords, self.number
+        return (coords[2 * number], coords[2 * number + 1])
+
+    # the connections from this node, as an unordered list
+    @property
+    def connections(self):
+
+        return self.graph.getConnections(self)
 
     # add a directed connection to toNode
     def addConnection(self, toNode, cost):
 
-        connection = Connection(self.graph, cost, self, toNode)
-        self.connections.append(connection)
-        self.graph.connections.append(connection)
+        self.graph.addConnection(self, toNode, cost)
 
 
 class NodeRecord:
+    __slots__ = ("node", "connection", "costSoFar", "estimatedCost")
+
     def __init__(self, node, connection, costSoFar, estimatedCost=0):
         self.node = node
         self.connection = connection
@@ -101,60 +701,325 @@ def heuristic(graph, node, end):
     return (Vector2(end.position) - Vector2(node.position)).length()
 
 
+# --- shortest routes from every node to end, by dijkstra over reversed connections ---
+# returns the first connection & the total cost of the route from each node, indexed by node.id
+def shortestRoutesTo(graph, end):
+
+    incoming = {}
+    for con in graph.connections:
+        incoming.setdefault(con.toNode.id, []).append(con)
+
+    routeNext = {}
+    costSoFar = {end.id: 0}
+    openHeap = [(0, 0, end)]
+    closed = set()
+    pushed = 1
+
+    while openHeap:
+
+        cost, _, node = heapq.heappop(openHeap)
+        if node.id in closed:
+            continue
+        closed.add(node.id)
+
+        for con in incoming.get(node.id, ()):
+            fromNode = con.fromNode
+            fromCost = cost + con.cost
+            if fromNode.id not in closed and fromCost < costSoFar.get(
+                fromNode.id, float("inf")
+            ):
+                costSoFar[fromNode.id] = fromCost
+                routeNext[fromNode.id] = con
+                heapq.heappush(openHeap, (fromCost, pushed, fromNode))
+                pushed += 1
+
+    # total route costs are summed from the start of the route like pathFindAStar's
+    routeCosts = {end.id: 0}
+    for nodeId in routeNext:
+        cost, con = 0, routeNext[nodeId]
+        while True:
+            cost += con.cost
+            if con.toNode.id == end.id:
+                break
+            con = routeNext[con.toNode.id]
+        routeCosts[nodeId] = cost
+
+    return routeNext, routeCosts
+
+
+# --- path finding by following the flow field towards end, shared by every search to end ---
+# returns the same list of connections as pathFindAStar() on graphs with precomputed routes
+def pathFindFlowField(graph, start, end):
+
+    return graph.getFlowField(end).getPath(start)
+
+
 def pathFindAStar(graph, start, end):
 
-    startRecord = NodeRecord(start, None, 0, heuristic(graph, start, end))
-    openList = {}
-    openList[startRecord.node.id] = startRecord
-    closedList = {}
+    # use precomputed routes when available
+    if graph.hasRoute(start, end):
+        if pathCache is not None:
+            pathCache.routed += 1
+        return graph.getRoute(start, end)
+
+    if pathCache is not None:
+        path = pathCache.get(graph, start, end)
+        if path is not None:
+            return path
+
+    if start.id == end.id:
+        return []
 
-    while openList:
+    # search over the graph's connection index
+    if start.id not in graph.numbers or end.id not in graph.numbers:
+        return None
+    startIndex, endIndex = graph.numbers[start.id], graph.numbers[end.id]
+    outgoing = graph.getCompact().outgoing
+    offsets, edges, neighbours, costs = (
+        outgoing.offsets,
+        outgoing.edges,
+        outgoing.neighbours,
+        outgoing.costs,
+    )
+    # heuristic() of every node, evaluated in one batch from the graph's coordinates
+    # so that the neighbours in each slice of the index are looked up by node number
+    endX, endY = graph.coords[2 * endIndex], graph.coords[2 * endIndex + 1]
+    positions = np.frombuffer(graph.coords).reshape(-1, 2)
+    heuristics = np.hypot(positions[:, 0] - endX, positions[:, 1] - endY).tolist()
+
+    # open list of cost so far, indexed by node number.
+    # ordered by estimated cost on a binary heap, ties are broken by the order nodes were opened in.
+    # nodes whose cost is lowered are pushed again, leaving stale heap entries behind
+    openCosts = {startIndex: 0}
+    openOrder = {startIndex: 0}
+    openHeap = [(heuristics[startIndex], 0, startIndex)]
+    closed = set()
+    # the connection number each node was reached by
+    cameBy = {}
 
-        # get smallest element in open list
-        current = min(openList.items(), key=lambda record: record[1].estimatedCost)[1]
+    current = None
+    while openHeap:
 
-        del openList[current.node.id]
+        # get smallest element in open list, skipping stale heap entries
+        nodeIndex = heapq.heappop(openHeap)[2]
+        if nodeIndex not in openCosts:
+            continue
+        current = nodeIndex
+        currentCost = openCosts.pop(nodeIndex)
 
-        if current.node.id == end.id:
+        if current == endIndex:
             break
 
-        connections = graph.getConnections(current.node)
+        first, last = offsets[current], offsets[current + 1]
+        for edge, toIndex, cost in zip(
+            edges[first:last],
+            neighbours[first:last],
+            costs[first:last],
+        ):
+            if toIndex in closed:
+                continue
+
+            toCost = currentCost + cost
+            if toIndex in openCosts:
+                if openCosts[toIndex] <= toCost:
+                    continue
+            else:
+                openOrder[toIndex] = len(openOrder)
+
+            openCosts[toIndex] = toCost
+            cameBy[toIndex] = edge
+            heapq.heappush(
+                openHeap, (toCost + heuristics[toIndex], openOrder[toIndex], toIndex)
+            )
+
+        closed.add(current)
+
+    if current != endIndex:
+        return None
+
+    path = []
+    while current != startIndex:
+        edge = cameBy[current]
+        path.append(Connection(graph, edge))
+        current = graph.sources[edge]
 
-        for con in connections:
-            endNode = con.toNode
-            endNodeCost = current.costSoFar + con.cost
+    path.reverse()
+
+    if pathCache is not None:
+        pathCache.put(graph, start, end, path)
+
+    return path
 
-            if endNode.id in closedList.keys():
+
+# --- dijkstra from source, over the given connection index, that stops at the nodes of the
+# coarse graph or target ---
+# source itself is always expanded, even if it is a coarse node.
+# returns the costs of reaching each coarse node & target found, by node number,
+# and the connection number each node was reached by
+def searchToCoarse(graph, coarse, index, source, target):
+
+    costs = {}
+    costSoFar = {source: 0}
+    cameBy = {}
+    openHeap = [(0, 0, source)]
+    openOrder = 1
+    closed = set()
+    while openHeap:
+        cost, _, current = heapq.heappop(openHeap)
+        if current in closed:
+            continue
+        closed.add(current)
+
+        # coarse nodes & the target are left to the coarse plan
+        if current == target or (
+            current != source and graph.views[current].id in coarse.nodes
+        ):
+            costs[current] = cost
+            continue
+
+        for edge, toIndex, edgeCost in zip(*index.row(current)):
+            toCost = cost + edgeCost
+            if toIndex in closed or costSoFar.get(toIndex, toCost + 1) <= toCost:
                 continue
+            costSoFar[toIndex] = toCost
+            cameBy[toIndex] = edge
+            heapq.heappush(openHeap, (toCost, openOrder, toIndex))
+            openOrder += 1
 
-            elif endNode.id in openList.keys():
-                if openList[endNode.id].costSoFar > endNodeCost:
-                    openList[endNode.id].costSoFar = endNodeCost
-                    openList[endNode.id].connection = con
-                    openList[endNode.id].estimatedCost = endNodeCost + heuristic(
-                        graph, endNode, end
-                    )
+    return costs, cameBy
 
-            else:
-                openList[endNode.id] = NodeRecord(
-                    endNode,
-                    con,
-                    endNodeCost,
-                    endNodeCost + heuristic(graph, endNode, end),
-                )
 
-        closedList[current.node.id] = current
+# --- returns the fine connections refining the given coarse connection, None if there are none ---
+# found by a local search that only follows the fine connections leaving the coarse connection's
+# from node. refinements are reused until the fine graph or coarse graph changes
+def refineConnection(fine, coarse, connection):
+
+    compact = fine.getCompact()
+    fromIndex = fine.numbers.get(connection.fromNode.id)
+    toIndex = fine.numbers.get(connection.toNode.id)
+    key = (coarse, coarse.version, fromIndex, toIndex)
+    if key not in compact.refined:
+        refined, cameBy = None, {}
+        if fromIndex is not None and toIndex is not None:
+            _, cameBy = searchToCoarse(
+                fine, coarse, compact.outgoing, fromIndex, toIndex
+            )
+        if toIndex in cameBy:
+            refined = []
+            current = toIndex
+            while current != fromIndex:
+                edge = cameBy[current]
+                refined.append(edge)
+                current = fine.sources[edge]
+            refined.reverse()
+        compact.refined[key] = refined
+
+    refined = compact.refined[key]
+    return None if refined is None else [Connection(fine, edge) for edge in refined]
+
+
+# --- two level path finding: plans on the coarse graph, then refines each coarse connection ---
+# the fine graph must contain the coarse graph's nodes, ie. be interpolated from the coarse graph.
+# start & end are nodes of the fine graph. returns a list of the fine graph's connections like
+# pathFindAStar(), falling back to pathFindAStar() on the fine graph if no coarse route is found
+def pathFindHierarchical(coarse, fine, start, end):
+
+    if start.id == end.id:
+        return []
+
+    if pathCache is not None:
+        path = pathCache.get(fine, start, end, coarse)
+        if path is not None:
+            return path
+
+    path = planAndRefine(coarse, fine, start, end)
+
+    if pathCache is not None and path is not None:
+        pathCache.put(fine, start, end, path, coarse)
 
-    if current.node.id != end.id:
+    return path
+
+
+# --- searches for the path of pathFindHierarchical(), uncached ---
+def planAndRefine(coarse, fine, start, end):
+
+    if start.id not in fine.numbers or end.id not in fine.numbers:
         return None
+    startIndex, endIndex = fine.numbers[start.id], fine.numbers[end.id]
+    compact = fine.getCompact()
 
+    # local searches from start to the coarse nodes it can enter the coarse graph at,
+    # and back from end to the coarse nodes it can leave the coarse graph at
+    if start.id in coarse.nodes:
+        entryCosts, entryCameBy = {startIndex: 0}, {}
     else:
-        path = []
+        entryCosts, entryCameBy = searchToCoarse(
+            fine, coarse, compact.outgoing, startIndex, endIndex
+        )
+    if end.id in coarse.nodes:
+        exitCosts, exitCameBy = {endIndex: 0}, {}
+    else:
+        exitCosts, exitCameBy = searchToCoarse(
+            fine, coarse, compact.getIncoming(), endIndex, startIndex
+        )
+
+    # choose the cheapest entry & exit, allowing for routes that never enter the coarse graph
+    best = None
+    if endIndex in entryCosts:
+        best = (entryCosts[endIndex], None, None)
+    for entry, entryCost in entryCosts.items():
+        entryNode = coarse.nodes.get(fine.views[entry].id)
+        if entryNode is None:
+            continue
+        for exit, exitCost in exitCosts.items():
+            exitNode = coarse.nodes.get(fine.views[exit].id)
+            if exitNode is None:
+                continue
+
+            routeCost = coarse.routeCost(entryNode, exitNode)
+            if routeCost is None and not coarse.hasRoute(entryNode, exitNode):
+                coarsePath = pathFindAStar(coarse, entryNode, exitNode)
+                if coarsePath is not None:
+                    routeCost = sum(con.cost for con in coarsePath)
+            if routeCost is None:
+                continue
+
+            cost = entryCost + routeCost + exitCost
+            if best is None or cost < best[0]:
+                best = (cost, entry, exit)
+
+    if best is None:
+        return pathFindAStar(fine, start, end)
+    _, entry, exit = best
+
+    # start to the entry node
+    path = []
+    current = endIndex if entry is None else entry
+    while current != startIndex:
+        edge = entryCameBy[current]
+        path.append(Connection(fine, edge))
+        current = fine.sources[edge]
+    path.reverse()
+    if entry is None:
+        return path
 
-        while current.node.id != start.id:
-            path.append(current.connection)
-            current = closedList[current.connection.fromNode.id]
+    # refine each coarse connection between the entry & exit nodes on the fine graph
+    coarsePath = pathFindAStar(
+        coarse,
+        coarse.nodes[fine.views[entry].id],
+        coarse.nodes[fine.views[exit].id],
+    )
+    for con in coarsePath:
+        refined = refineConnection(fine, coarse, con)
+        if refined is None:
+            return pathFindAStar(fine, start, end)
+        path.extend(refined)
 
-        path.reverse()
+    # exit node to end
+    current = exit
+    while current != endIndex:
+        edge = exitCameBy[current]
+        path.append(Connection(fine, edge))
+        current = fine.targets[edge]
 
     return path
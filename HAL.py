@@ -1,5 +1,6 @@
 import os
 import sys
+import heapq
 import pygame
 
 from pathlib import Path
@@ -22,6 +23,15 @@ from Base import *
 
 from logger import loggers
 from camera import cameras
+from map_bundle import load_graph
+from SpatialHash import RectGrid, SpatialHash
+from NearestOpponents import NearestOpponents
+from Kinematics import Kinematics
+from Occupancy import Occupancy
+from LineOfSight import LineOfSight, LineOfSightCache, VisibilityMatrix
+from render_resources import get_font, render_text
+from dirty_renderer import DirtyRenderer
+from sprite_atlas import get_sprite
 
 
 def import_npc(path):
@@ -66,13 +76,37 @@ class World(object):
 
         self.entities = {}
         self.entity_id = 0
+        # entities by (team_id, kind), each in id order. see ENTITY_KINDS for kinds
+        self.registries = {}
+        # entities bucketed by position, partitioned by (team_id, kind), for radius & nearest queries
+        self.spatial_hash = SpatialHash()
+        # entities bucketed by rect, partitioned by (team_id, kind), as a collision broad phase
+        self.rect_grid = RectGrid()
+        # nearest opponents cached once per frame, if enabled
+        self.nearest_opponents = (
+            NearestOpponents(self) if NEAREST_OPPONENT_CACHE else None
+        )
+        # kinematic state of entities as a structure of arrays, if enabled
+        self.kinematics = Kinematics() if SOA_KINEMATICS else None
+        # no. of frames processed
+        self.frame = 0
         self.obstacles = []
-        self.background = pygame.image.load(
-            "assets/grass_bkgrd_1024_768.png"
-        ).convert_alpha()
+        # occupancy map of the static obstacles, shared by collision checks
+        self.occupancy = Occupancy(self)
+        # line of sight ray casts over the occupancy map
+        self.line_of_sight = LineOfSight(self)
+        # line of sight checks cached until their ends move, if enabled
+        self.line_of_sight_cache = (
+            LineOfSightCache(self, LOS_CACHE_TOLERANCE) if LOS_CACHE else None
+        )
+        self.background = get_sprite("background")
 
         self.graph = Graph(self)
         self.generate_pathfinding_graphs("pathfinding_graph.txt")
+        # interpolated graphs shared by all characters, by (graph, interval_dist)
+        self.interpolated_graphs = {}
+        # node visibility matrices shared by all characters, by (graph, ray_width, step_dist)
+        self.visibility_matrices = {}
         self.scores = [0, 0]
 
         self.countdown_timer = TIME_LIMIT
@@ -81,49 +115,38 @@ class World(object):
     # --- Reads a set of pathfinding graphs from a file ---
     def generate_pathfinding_graphs(self, filename):
 
-        f = open(filename, "r")
+        nodes, connections, orc_paths = load_graph(filename)
 
         # Create the nodes
-        line = f.readline()
-        while line != "connections\n":
-            data = line.split()
-            self.graph.nodes[int(data[0])] = Node(
-                self.graph, int(data[0]), int(data[1]), int(data[2])
-            )
-            line = f.readline()
+        for node_id, x, y in nodes.tolist():
+            self.graph.nodes[node_id] = Node(self.graph, node_id, x, y)
 
         # Create the connections
-        line = f.readline()
-        while line != "paths\n":
-            data = line.split()
-            node0 = int(data[0])
-            node1 = int(data[1])
+        for node0, node1 in connections.tolist():
             distance = (
                 Vector2(self.graph.nodes[node0].position)
                 - Vector2(self.graph.nodes[node1].position)
             ).length()
             self.graph.nodes[node0].addConnection(self.graph.nodes[node1], distance)
             self.graph.nodes[node1].addConnection(self.graph.nodes[node0], distance)
-            line = f.readline()
 
         # Create the orc paths, which are also Graphs
         self.paths = []
-        line = f.readline()
-        while line != "":
+        for data in orc_paths:
             path = Graph(self)
-            data = line.split()
+            data = data.tolist()
 
             # Create the nodes
             for i in range(0, len(data)):
-                node = self.graph.nodes[int(data[i])]
-                path.nodes[int(data[i])] = Node(
-                    path, int(data[i]), node.position[0], node.position[1]
+                node = self.graph.nodes[data[i]]
+                path.nodes[data[i]] = Node(
+                    path, data[i], node.position[0], node.position[1]
                 )
 
             # Create the connections
             for i in range(0, len(data) - 1):
-                node0 = int(data[i])
-                node1 = int(data[i + 1])
+                node0 = data[i]
+                node1 = data[i + 1]
                 distance = (
                     Vector2(self.graph.nodes[node0].position)
                     - Vector2(self.graph.nodes[node1].position)
@@ -133,9 +156,54 @@ class World(object):
 
             self.paths.append(path)
 
-            line = f.readline()
+        # the world graph & orc paths never change after loading: precompute their routes
+        self.graph.precomputeRoutes()
+        for path in self.paths:
+            path.precomputeRoutes()
 
-        f.close()
+    # --- Returns the graph interpolated every interval_dist, shared read-only by all callers ---
+    def get_interpolated_graph(self, graph, interval_dist=20):
+
+        version, interp_graph = self.interpolated_graphs.get(
+            (graph, interval_dist), (None, None)
+        )
+        if version != graph.version:
+            interp_graph = graph.interpolate(interval_dist)
+            self.interpolated_graphs[(graph, interval_dist)] = (
+                graph.version,
+                interp_graph,
+            )
+
+        return interp_graph
+
+    # --- Returns the node visibility matrix of the graph, shared read-only by all callers ---
+    # computed once for the graph & obstacles, recomputed if either changes
+    def get_visibility_matrix(self, graph, ray_width=26, step_dist=10):
+
+        self.occupancy.refresh()
+        version, generation, matrix = self.visibility_matrices.get(
+            (graph, ray_width, step_dist), (None, None, None)
+        )
+        if version != graph.version or generation != self.occupancy.generation:
+            matrix = VisibilityMatrix(self, graph, ray_width, step_dist)
+            self.visibility_matrices[(graph, ray_width, step_dist)] = (
+                graph.version,
+                self.occupancy.generation,
+                matrix,
+            )
+
+        return matrix
+
+    # --- Precomputes the node visibility matrices of the graph & its interpolated graph ---
+    # called once the obstacles are placed, so that characters never stall in game computing them
+    def precompute_visibility_matrices(self, ray_width=26, step_dist=10):
+
+        # obstacles' rects are otherwise only synced as the obstacles are first processed
+        for obstacle in self.obstacles:
+            obstacle.sync_rect(obstacle.position)
+
+        for graph in (self.graph, self.get_interpolated_graph(self.graph)):
+            self.get_visibility_matrix(graph, ray_width, step_dist)
 
     def add_entity(self, entity):
 
@@ -143,6 +211,29 @@ class World(object):
         entity.id = self.entity_id
         self.entity_id += 1
 
+        partition = registry_key(entity)
+        self.registries.setdefault(partition, {})[entity.id] = entity
+        self.spatial_hash.insert(entity, partition)
+        if entity.image is not None:
+            self.rect_grid.insert(entity, partition)
+        if self.nearest_opponents is not None:
+            self.nearest_opponents.added(entity)
+        if self.kinematics is not None:
+            self.kinematics.insert(entity)
+
+    # --- called when an entity in the world has changed position ---
+    def move_entity(self, entity):
+
+        self.spatial_hash.move(entity)
+        if self.nearest_opponents is not None:
+            self.nearest_opponents.moved(entity)
+
+    # --- called when the rect of an entity in the world has changed ---
+    def move_rect(self, entity):
+
+        self.rect_grid.move(entity)
+        self.occupancy.moved(entity)
+
     def remove_entity(self, entity):
 
         if entity.name == "base":
@@ -154,6 +245,52 @@ class World(object):
 
         if entity.id in self.entities.keys():
             del self.entities[entity.id]
+            del self.registries[registry_key(entity)][entity.id]
+            self.spatial_hash.remove(entity)
+            if entity.rect_cells is not None:
+                self.rect_grid.remove(entity)
+            if self.kinematics is not None:
+                self.kinematics.remove(entity)
+            if self.line_of_sight_cache is not None:
+                self.line_of_sight_cache.removed(entity)
+
+    # --- returns the (team_id, kind) registries with any of the given teams & kinds ---
+    # teams or kinds may be None to include every team or kind
+    def get_partitions(self, teams=None, kinds=None):
+
+        return [
+            (team_id, kind)
+            for team_id, kind in self.registries
+            if (teams is None or team_id in teams) and (kinds is None or kind in kinds)
+        ]
+
+    # --- returns the entities with any of the given teams & kinds, in id order ---
+    def get_entities(self, teams=None, kinds=None):
+
+        return self.get_partition_entities(self.get_partitions(teams, kinds))
+
+    # --- returns the entities in the given (team_id, kind) registries, in id order ---
+    def get_partition_entities(self, partitions):
+
+        registries = [self.registries[partition].values() for partition in partitions]
+        return list(heapq.merge(*registries, key=lambda entity: entity.id))
+
+    # --- returns the team ids that are opponents of the given team ---
+    def get_opponent_teams(self, team_id):
+
+        return {
+            other_id
+            for other_id, _ in self.registries
+            if other_id != NEUTRAL_TEAM_ID and other_id != team_id
+        }
+
+    # --- returns the partitions of entities that can be opponents of the given team ---
+    def get_opponent_partitions(self, team_id):
+
+        opponent_kinds = {
+            kind for _, kind in self.registries if kind not in TRANSIENT_KINDS
+        }
+        return self.get_partitions(self.get_opponent_teams(team_id), opponent_kinds)
 
     def get(self, entity_id):
 
@@ -165,8 +302,12 @@ class World(object):
 
     def process(self, time_passed):
 
+        self.frame += 1
         time_passed_seconds = time_passed / 1000.0
-        for entity in list(self.entities.values()):
+        entities = list(self.entities.values())
+        if self.kinematics is not None:
+            self.process_kinematics(entities, time_passed_seconds)
+        for entity in entities:
             entity.process(time_passed_seconds)
 
         # --- Reduces the overall countdown timer
@@ -186,6 +327,36 @@ class World(object):
                 self.game_result = "DRAW"
                 self.final_scores = str(self.scores[0]) + " - " + str(self.scores[1])
 
+    # --- processes up to n_frames frames of time_passed milliseconds each ---
+    # stops early if the game ends, returning the no. of frames processed.
+    # does not render or touch the display, so worlds can be simulated without one.
+    def step(self, n_frames=1, time_passed=1000 / 30):
+
+        for n_processed in range(n_frames):
+            if self.game_end:
+                return n_processed
+            self.process(time_passed)
+
+        return n_frames
+
+    # --- thinks then moves every entity, stepping the kinematic store in one go ---
+    def process_kinematics(self, entities, time_passed):
+
+        for entity in entities:
+            entity.brain.think()
+
+        # entities removed while thinking no longer move
+        entities = [e for e in entities if e.kinematic_slot is not None]
+        if not entities:
+            return
+        moved, undone, outside = self.kinematics.step(
+            entities, time_passed, (SCREEN_WIDTH, SCREEN_HEIGHT)
+        )
+        for entity, entity_moved, entity_undone, entity_outside in zip(
+            entities, moved.tolist(), undone.tolist(), outside.tolist()
+        ):
+            entity.apply_kinematics(entity_moved, entity_undone, entity_outside)
+
     def render(self, surface):
 
         # draw background and text
@@ -199,45 +370,66 @@ class World(object):
         for entity in self.entities.values():
             entity.render(surface)
 
-        # draw the scores
-        font = pygame.font.SysFont("arial", 24, True)
+        # draw the scores, timer & end of game messages
+        for label, position in self.get_hud_labels():
+            surface.blit(label, position)
 
-        blue_score = font.render(
-            TEAM_NAME[0] + " score = " + str(self.scores[0]), True, (0, 0, 255)
-        )
-        surface.blit(blue_score, (150, 10))
+    # --- returns the labels drawn over the game, as (surface, position) ---
+    def get_hud_labels(self):
 
-        red_score = font.render(
-            TEAM_NAME[1] + " score = " + str(self.scores[1]), True, (255, 0, 0)
-        )
-        surface.blit(red_score, (870 - red_score.get_size()[0], 730))
+        labels = []
 
-        # draw the countdown timer
-        timer = font.render(
-            str("Time left = " + str(int(self.countdown_timer))), True, (255, 255, 255)
+        # the scores, only rendered again when they change
+        blue_score = render_text(
+            TEAM_NAME[0] + " score = " + str(self.scores[0]),
+            (0, 0, 255),
+            "arial",
+            24,
+            True,
+        )
+        labels.append((blue_score, (150, 10)))
+
+        red_score = render_text(
+            TEAM_NAME[1] + " score = " + str(self.scores[1]),
+            (255, 0, 0),
+            "arial",
+            24,
+            True,
+        )
+        labels.append((red_score, (870 - red_score.get_size()[0], 730)))
+
+        # the countdown timer
+        timer = render_text(
+            str("Time left = " + str(int(self.countdown_timer))),
+            (255, 255, 255),
+            "arial",
+            24,
+            True,
         )
         w, h = timer.get_size()
-        surface.blit(timer, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2))
+        labels.append(
+            (timer, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2))
+        )
 
         # game end
         if self.game_end:
-            end_font = pygame.font.SysFont("arial", 60, True)
-
-            msg = end_font.render(self.game_result, True, (255, 255, 255))
+            msg = render_text(self.game_result, (255, 255, 255), "arial", 60, True)
             w, h = msg.get_size()
-            surface.blit(
-                msg, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2 - 200)
+            labels.append(
+                (msg, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2 - 200))
             )
 
-            msg = end_font.render(self.final_scores, True, (255, 255, 255))
+            msg = render_text(self.final_scores, (255, 255, 255), "arial", 60, True)
             w, h = msg.get_size()
-            surface.blit(
-                msg, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2 - 100)
+            labels.append(
+                (msg, (SCREEN_WIDTH // 2 - w // 2, SCREEN_HEIGHT // 2 - h // 2 - 100))
             )
 
+        return labels
+
     def get_entity(self, name):
 
-        for entity in self.entities.values():
+        for entity in self.get_entities(kinds=[ENTITY_KINDS.get(name, "other")]):
             if entity.name == name:
                 return entity
 
@@ -246,34 +438,15 @@ class World(object):
     # --- returns the nearest opponent, which is a non-projectile, character from the opposing team that is not ko'd ---
     def get_nearest_opponent(self, char):
 
-        nearest_opponent = None
-        distance = 0.0
-
-        for entity in self.entities.values():
+        if self.nearest_opponents is not None:
+            return self.nearest_opponents.nearest(char)
 
-            # neutral entity
-            if entity.team_id == 2:
-                continue
-
-            # same team
-            if entity.team_id == char.team_id:
-                continue
-
-            if entity.name == "projectile" or entity.name == "explosion":
-                continue
-
-            if entity.ko:
-                continue
-
-            if nearest_opponent is None:
-                nearest_opponent = entity
-                distance = (char.position - entity.position).length()
-            else:
-                if distance > (char.position - entity.position).length():
-                    distance = (char.position - entity.position).length()
-                    nearest_opponent = entity
-
-        return nearest_opponent
+        # only search the registries of the opposing team's non projectile entities
+        return self.spatial_hash.nearest(
+            char.position,
+            lambda entity: not entity.ko,
+            self.get_opponent_partitions(char.team_id),
+        )
 
 
 class Obstacle(GameEntity):
@@ -290,9 +463,15 @@ class Obstacle(GameEntity):
         GameEntity.process(self, time_passed)
 
 
+# --- returns the key of the (team_id, kind) registry the entity belongs to ---
+def registry_key(entity):
+
+    return (entity.team_id, ENTITY_KINDS.get(entity.name, "other"))
+
+
 def log_metrics(world, log, metrics_step):
     # -- log game world metrics to logger
-    for entity in world.entities.values():
+    for entity in world.get_entities(kinds=["heroes"]):
         # add team prefix if the entity belongs to a team
         team_prefix = (
             f"team_{TEAM_NAME[entity.team_id]}_" if entity.team_id != 2 else ""
@@ -345,6 +524,264 @@ def log_metrics(world, log, metrics_step):
     log.scores(world.scores, step=metrics_step)
 
 
+def create_world(npc_blue_srcs=NPC_BLUE_SRCS, npc_red_srcs=NPC_RED_SRCS):
+    """
+    Create a world set up for a game between the knight, archer & wizard NPCs loaded
+    from the given python sources for the blue & red teams.
+    Needs no display: advance the game with World.step() & read the world's results.
+    Sprites are converted for fast blitting only if a display has already been set.
+    """
+    Knight_TeamA = import_npc(npc_blue_srcs[0])
+    Archer_TeamA = import_npc(npc_blue_srcs[1])
+    Wizard_TeamA = import_npc(npc_blue_srcs[2])
+
+    Knight_TeamB = import_npc(npc_red_srcs[0])
+    Archer_TeamB = import_npc(npc_red_srcs[1])
+    Wizard_TeamB = import_npc(npc_red_srcs[2])
+
+    world = World()
+
+    # --- Load images ---
+    blue_base_image = get_sprite("blue_base")
+    blue_orc_image = get_sprite("blue_orc")
+    blue_tower_image = get_sprite("blue_tower")
+    blue_rock_image = get_sprite("blue_rock")
+    blue_knight_image = get_sprite("blue_knight")
+    blue_archer_image = get_sprite("blue_archer")
+    blue_arrow_image = get_sprite("blue_arrow")
+    blue_wizard_image = get_sprite("blue_wizard")
+    blue_explosion_image = get_sprite("blue_explosion")
+
+    red_base_image = get_sprite("red_base")
+    red_orc_image = get_sprite("red_orc")
+    red_tower_image = get_sprite("red_tower")
+    red_rock_image = get_sprite("red_rock")
+    red_knight_image = get_sprite("red_knight")
+    red_archer_image = get_sprite("red_archer")
+    red_arrow_image = get_sprite("red_arrow")
+    red_wizard_image = get_sprite("red_wizard")
+    red_explosion_image = get_sprite("red_explosion")
+
+    grey_tower_image = get_sprite("grey_tower")
+    grey_projectile_image = get_sprite("grey_rock")
+    mountain_image_1 = get_sprite("mountain_1")
+    mountain_image_2 = get_sprite("mountain_2")
+    plateau_image = get_sprite("plateau")
+
+    # --- Initialize Blue buildings and units ---
+
+    blue_base = Base(world, blue_base_image, blue_orc_image, blue_rock_image, 0, 4)
+    blue_base.position = Vector2(68, 68)
+    blue_base.team_id = 0
+    blue_base.max_hp = BASE_MAX_HP
+    blue_base.min_target_distance = BASE_MIN_TARGET_DISTANCE
+    blue_base.projectile_range = BASE_PROJECTILE_RANGE
+    blue_base.projectile_speed = BASE_PROJECTILE_SPEED
+    blue_base.ranged_damage = BASE_RANGED_DAMAGE
+    blue_base.ranged_cooldown = BASE_RANGED_COOLDOWN
+    blue_base.current_hp = blue_base.max_hp
+    blue_base.brain.set_state("base_state")
+    world.add_entity(blue_base)
+
+    blue_tower_1 = Tower(world, blue_tower_image, blue_rock_image)
+    blue_tower_1.position = Vector2(200, 100)
+    blue_tower_1.team_id = 0
+    blue_tower_1.max_hp = TOWER_MAX_HP
+    blue_tower_1.min_target_distance = TOWER_MIN_TARGET_DISTANCE
+    blue_tower_1.projectile_range = TOWER_PROJECTILE_RANGE
+    blue_tower_1.projectile_speed = TOWER_PROJECTILE_SPEED
+    blue_tower_1.ranged_damage = TOWER_RANGED_DAMAGE
+    blue_tower_1.ranged_cooldown = TOWER_RANGED_COOLDOWN
+    blue_tower_1.current_hp = blue_tower_1.max_hp
+    blue_tower_1.brain.set_state("tower_state")
+    world.add_entity(blue_tower_1)
+
+    blue_tower_2 = Tower(world, blue_tower_image, blue_rock_image)
+    blue_tower_2.position = Vector2(105, 190)
+    blue_tower_2.team_id = 0
+    blue_tower_2.max_hp = TOWER_MAX_HP
+    blue_tower_2.min_target_distance = TOWER_MIN_TARGET_DISTANCE
+    blue_tower_2.projectile_range = TOWER_PROJECTILE_RANGE
+    blue_tower_2.projectile_speed = TOWER_PROJECTILE_SPEED
+    blue_tower_2.ranged_damage = TOWER_RANGED_DAMAGE
+    blue_tower_2.ranged_cooldown = TOWER_RANGED_COOLDOWN
+    blue_tower_2.current_hp = blue_tower_2.max_hp
+    blue_tower_2.brain.set_state("tower_state")
+    world.add_entity(blue_tower_2)
+
+    blue_knight = Knight_TeamA(
+        world, blue_knight_image, blue_base, Vector2(blue_base.spawn_position)
+    )
+    blue_knight.team_id = 0
+    blue_knight.max_hp = KNIGHT_MAX_HP
+    blue_knight.maxSpeed = KNIGHT_MAX_SPEED
+    blue_knight.min_target_distance = KNIGHT_MIN_TARGET_DISTANCE
+    blue_knight.melee_damage = KNIGHT_MELEE_DAMAGE
+    blue_knight.melee_cooldown = KNIGHT_MELEE_COOLDOWN
+    blue_knight.current_hp = blue_knight.max_hp
+    world.add_entity(blue_knight)
+
+    blue_archer = Archer_TeamA(
+        world,
+        blue_archer_image,
+        blue_arrow_image,
+        blue_base,
+        Vector2(blue_base.spawn_position),
+    )
+    blue_archer.team_id = 0
+    blue_archer.max_hp = ARCHER_MAX_HP
+    blue_archer.maxSpeed = ARCHER_MAX_SPEED
+    blue_archer.min_target_distance = ARCHER_MIN_TARGET_DISTANCE
+    blue_archer.projectile_range = ARCHER_PROJECTILE_RANGE
+    blue_archer.projectile_speed = ARCHER_PROJECTILE_SPEED
+    blue_archer.ranged_damage = ARCHER_RANGED_DAMAGE
+    blue_archer.ranged_cooldown = ARCHER_RANGED_COOLDOWN
+    blue_archer.current_hp = blue_archer.max_hp
+    world.add_entity(blue_archer)
+
+    blue_wizard = Wizard_TeamA(
+        world,
+        blue_wizard_image,
+        blue_rock_image,
+        blue_base,
+        Vector2(blue_base.spawn_position),
+        blue_explosion_image,
+    )
+    blue_wizard.team_id = 0
+    blue_wizard.max_hp = WIZARD_MAX_HP
+    blue_wizard.maxSpeed = WIZARD_MAX_SPEED
+    blue_wizard.min_target_distance = WIZARD_MIN_TARGET_DISTANCE
+    blue_wizard.projectile_range = WIZARD_PROJECTILE_RANGE
+    blue_wizard.projectile_speed = WIZARD_PROJECTILE_SPEED
+    blue_wizard.ranged_damage = WIZARD_RANGED_DAMAGE
+    blue_wizard.ranged_cooldown = WIZARD_RANGED_COOLDOWN
+    blue_wizard.current_hp = blue_wizard.max_hp
+    world.add_entity(blue_wizard)
+
+    # --- Initialize Red buildings and units ---
+    red_base = Base(world, red_base_image, red_orc_image, red_rock_image, 4, 0)
+    red_base.position = Vector2(SCREEN_WIDTH - 68, SCREEN_HEIGHT - 68)
+    red_base.team_id = 1
+    red_base.max_hp = BASE_MAX_HP * RED_MULTIPLIER
+    red_base.min_target_distance = BASE_MIN_TARGET_DISTANCE
+    red_base.projectile_range = BASE_PROJECTILE_RANGE
+    red_base.projectile_speed = BASE_PROJECTILE_SPEED
+    red_base.ranged_damage = BASE_RANGED_DAMAGE * RED_MULTIPLIER
+    red_base.ranged_cooldown = BASE_RANGED_COOLDOWN
+    red_base.current_hp = red_base.max_hp
+    red_base.brain.set_state("base_state")
+    world.add_entity(red_base)
+
+    red_tower_1 = Tower(world, red_tower_image, red_rock_image)
+    red_tower_1.position = Vector2(820, 660)
+    red_tower_1.team_id = 1
+    red_tower_1.max_hp = TOWER_MAX_HP * RED_MULTIPLIER
+    red_tower_1.min_target_distance = TOWER_MIN_TARGET_DISTANCE
+    red_tower_1.projectile_range = TOWER_PROJECTILE_RANGE
+    red_tower_1.projectile_speed = TOWER_PROJECTILE_SPEED
+    red_tower_1.ranged_damage = TOWER_RANGED_DAMAGE * RED_MULTIPLIER
+    red_tower_1.ranged_cooldown = TOWER_RANGED_COOLDOWN
+    red_tower_1.current_hp = red_tower_1.max_hp
+    red_tower_1.brain.set_state("tower_state")
+    world.add_entity(red_tower_1)
+
+    red_tower_2 = Tower(world, red_tower_image, red_rock_image)
+    red_tower_2.position = Vector2(910, 570)
+    red_tower_2.team_id = 1
+    red_tower_2.max_hp = TOWER_MAX_HP * RED_MULTIPLIER
+    red_tower_2.min_target_distance = TOWER_MIN_TARGET_DISTANCE
+    red_tower_2.projectile_range = TOWER_PROJECTILE_RANGE
+    red_tower_2.projectile_speed = TOWER_PROJECTILE_SPEED
+    red_tower_2.ranged_damage = TOWER_RANGED_DAMAGE * RED_MULTIPLIER
+    red_tower_2.ranged_cooldown = TOWER_RANGED_COOLDOWN
+    red_tower_2.current_hp = red_tower_2.max_hp
+    red_tower_2.brain.set_state("tower_state")
+    world.add_entity(red_tower_2)
+
+    red_knight = Knight_TeamB(
+        world, red_knight_image, red_base, Vector2(red_base.spawn_position)
+    )
+    red_knight.team_id = 1
+    red_knight.max_hp = KNIGHT_MAX_HP * RED_MULTIPLIER
+    red_knight.maxSpeed = KNIGHT_MAX_SPEED
+    red_knight.min_target_distance = KNIGHT_MIN_TARGET_DISTANCE
+    red_knight.melee_damage = KNIGHT_MELEE_DAMAGE * RED_MULTIPLIER
+    red_knight.melee_cooldown = KNIGHT_MELEE_COOLDOWN
+    red_knight.current_hp = red_knight.max_hp
+    world.add_entity(red_knight)
+
+    red_archer = Archer_TeamB(
+        world,
+        red_archer_image,
+        red_arrow_image,
+        red_base,
+        Vector2(red_base.spawn_position),
+    )
+    red_archer.team_id = 1
+    red_archer.max_hp = ARCHER_MAX_HP * RED_MULTIPLIER
+    red_archer.maxSpeed = ARCHER_MAX_SPEED
+    red_archer.min_target_distance = ARCHER_MIN_TARGET_DISTANCE
+    red_archer.projectile_range = ARCHER_PROJECTILE_RANGE
+    red_archer.projectile_speed = ARCHER_PROJECTILE_SPEED
+    red_archer.ranged_damage = ARCHER_RANGED_DAMAGE * RED_MULTIPLIER
+    red_archer.ranged_cooldown = ARCHER_RANGED_COOLDOWN
+    red_archer.current_hp = red_archer.max_hp
+    world.add_entity(red_archer)
+
+    red_wizard = Wizard_TeamB(
+        world,
+        red_wizard_image,
+        red_rock_image,
+        red_base,
+        Vector2(red_base.spawn_position),
+        red_explosion_image,
+    )
+    red_wizard.team_id = 1
+    red_wizard.max_hp = WIZARD_MAX_HP * RED_MULTIPLIER
+    red_wizard.maxSpeed = WIZARD_MAX_SPEED
+    red_wizard.min_target_distance = WIZARD_MIN_TARGET_DISTANCE
+    red_wizard.projectile_range = WIZARD_PROJECTILE_RANGE
+    red_wizard.projectile_speed = WIZARD_PROJECTILE_SPEED
+    red_wizard.ranged_damage = WIZARD_RANGED_DAMAGE * RED_MULTIPLIER
+    red_wizard.ranged_cooldown = WIZARD_RANGED_COOLDOWN
+    red_wizard.current_hp = red_wizard.max_hp
+    world.add_entity(red_wizard)
+
+    # --- Initialize other entities in the world ---
+    mountain_1 = Obstacle(world, mountain_image_1)
+    mountain_1.position = Vector2(410, 460)
+    mountain_1.team_id = 2
+    world.add_entity(mountain_1)
+    world.obstacles.append(mountain_1)
+
+    mountain_2 = Obstacle(world, mountain_image_2)
+    mountain_2.position = Vector2(620, 280)
+    mountain_2.team_id = 2
+    world.add_entity(mountain_2)
+    world.obstacles.append(mountain_2)
+
+    plateau = Obstacle(world, plateau_image)
+    plateau.position = Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+    plateau.team_id = 2
+    world.add_entity(plateau)
+    world.obstacles.append(plateau)
+
+    grey_tower = Tower(world, grey_tower_image, grey_projectile_image)
+    grey_tower.position = Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 10)
+    grey_tower.team_id = 2
+    grey_tower.min_target_distance = GREY_TOWER_MIN_TARGET_DISTANCE
+    grey_tower.projectile_range = GREY_TOWER_PROJECTILE_RANGE
+    grey_tower.projectile_speed = GREY_TOWER_PROJECTILE_SPEED
+    grey_tower.ranged_damage = GREY_TOWER_RANGED_DAMAGE
+    grey_tower.ranged_cooldown = GREY_TOWER_RANGED_COOLDOWN
+    grey_tower.brain.set_state("tower_state")
+    world.add_entity(grey_tower)
+
+    world.precompute_visibility_matrices()
+
+    return world
+
+
 def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
     """
     Run the HAL game.
@@ -355,14 +792,6 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
     seed(RANDOM_SEED)
     print(f"Using RNG seed: {RANDOM_SEED}")
 
-    Knight_TeamA = import_npc(KNIGHT_BLUE_SRC)
-    Archer_TeamA = import_npc(ARCHER_BLUE_SRC)
-    Wizard_TeamA = import_npc(WIZARD_BLUE_SRC)
-
-    Knight_TeamB = import_npc(KNIGHT_RED_SRC)
-    Archer_TeamB = import_npc(ARCHER_RED_SRC)
-    Wizard_TeamB = import_npc(WIZARD_RED_SRC)
-
     # log game parameters
     with log:
         log.params(PARAMS)
@@ -370,264 +799,10 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
         pygame.init()
         screen = pygame.display.set_mode(SCREEN_SIZE, 0, 32)
 
-        world = World()
+        world = create_world()
 
         w, h = SCREEN_SIZE
 
-        # --- Load images ---
-        blue_base_image = pygame.image.load("assets/blue_base.png").convert_alpha()
-        blue_orc_image = pygame.image.load("assets/blue_orc_32_32.png").convert_alpha()
-        blue_tower_image = pygame.image.load("assets/blue_tower.png").convert_alpha()
-        blue_rock_image = pygame.image.load("assets/blue_rock.png").convert_alpha()
-        blue_knight_image = pygame.image.load(
-            "assets/blue_knight_32_32.png"
-        ).convert_alpha()
-        blue_archer_image = pygame.image.load(
-            "assets/blue_archer_32_32.png"
-        ).convert_alpha()
-        blue_arrow_image = pygame.image.load("assets/blue_arrow.png").convert_alpha()
-        blue_wizard_image = pygame.image.load(
-            "assets/blue_wizard_32_32.png"
-        ).convert_alpha()
-        blue_explosion_image = pygame.image.load(
-            "assets/blue_explosion.png"
-        ).convert_alpha()
-
-        red_base_image = pygame.image.load("assets/red_base.png").convert_alpha()
-        red_orc_image = pygame.image.load("assets/red_orc_32_32.png").convert_alpha()
-        red_tower_image = pygame.image.load("assets/red_tower.png").convert_alpha()
-        red_rock_image = pygame.image.load("assets/red_rock.png").convert_alpha()
-        red_knight_image = pygame.image.load(
-            "assets/red_knight_32_32.png"
-        ).convert_alpha()
-        red_archer_image = pygame.image.load(
-            "assets/red_archer_32_32.png"
-        ).convert_alpha()
-        red_arrow_image = pygame.image.load("assets/red_arrow.png").convert_alpha()
-        red_wizard_image = pygame.image.load(
-            "assets/red_wizard_32_32.png"
-        ).convert_alpha()
-        red_explosion_image = pygame.image.load(
-            "assets/red_explosion.png"
-        ).convert_alpha()
-
-        grey_tower_image = pygame.image.load("assets/grey_tower.png").convert_alpha()
-        grey_projectile_image = pygame.image.load(
-            "assets/grey_rock.png"
-        ).convert_alpha()
-        mountain_image_1 = pygame.image.load("assets/mountain_1.png").convert_alpha()
-        mountain_image_2 = pygame.image.load("assets/mountain_2.png").convert_alpha()
-        plateau_image = pygame.image.load("assets/plateau.png").convert_alpha()
-
-        # --- Initialize Blue buildings and units ---
-
-        blue_base = Base(world, blue_base_image, blue_orc_image, blue_rock_image, 0, 4)
-        blue_base.position = Vector2(68, 68)
-        blue_base.team_id = 0
-        blue_base.max_hp = BASE_MAX_HP
-        blue_base.min_target_distance = BASE_MIN_TARGET_DISTANCE
-        blue_base.projectile_range = BASE_PROJECTILE_RANGE
-        blue_base.projectile_speed = BASE_PROJECTILE_SPEED
-        blue_base.ranged_damage = BASE_RANGED_DAMAGE
-        blue_base.ranged_cooldown = BASE_RANGED_COOLDOWN
-        blue_base.current_hp = blue_base.max_hp
-        blue_base.brain.set_state("base_state")
-        world.add_entity(blue_base)
-
-        blue_tower_1 = Tower(world, blue_tower_image, blue_rock_image)
-        blue_tower_1.position = Vector2(200, 100)
-        blue_tower_1.team_id = 0
-        blue_tower_1.max_hp = TOWER_MAX_HP
-        blue_tower_1.min_target_distance = TOWER_MIN_TARGET_DISTANCE
-        blue_tower_1.projectile_range = TOWER_PROJECTILE_RANGE
-        blue_tower_1.projectile_speed = TOWER_PROJECTILE_SPEED
-        blue_tower_1.ranged_damage = TOWER_RANGED_DAMAGE
-        blue_tower_1.ranged_cooldown = TOWER_RANGED_COOLDOWN
-        blue_tower_1.current_hp = blue_tower_1.max_hp
-        blue_tower_1.brain.set_state("tower_state")
-        world.add_entity(blue_tower_1)
-
-        blue_tower_2 = Tower(world, blue_tower_image, blue_rock_image)
-        blue_tower_2.position = Vector2(105, 190)
-        blue_tower_2.team_id = 0
-        blue_tower_2.max_hp = TOWER_MAX_HP
-        blue_tower_2.min_target_distance = TOWER_MIN_TARGET_DISTANCE
-        blue_tower_2.projectile_range = TOWER_PROJECTILE_RANGE
-        blue_tower_2.projectile_speed = TOWER_PROJECTILE_SPEED
-        blue_tower_2.ranged_damage = TOWER_RANGED_DAMAGE
-        blue_tower_2.ranged_cooldown = TOWER_RANGED_COOLDOWN
-        blue_tower_2.current_hp = blue_tower_2.max_hp
-        blue_tower_2.brain.set_state("tower_state")
-        world.add_entity(blue_tower_2)
-
-        blue_knight = Knight_TeamA(
-            world, blue_knight_image, blue_base, Vector2(blue_base.spawn_position)
-        )
-        blue_knight.team_id = 0
-        blue_knight.max_hp = KNIGHT_MAX_HP
-        blue_knight.maxSpeed = KNIGHT_MAX_SPEED
-        blue_knight.min_target_distance = KNIGHT_MIN_TARGET_DISTANCE
-        blue_knight.melee_damage = KNIGHT_MELEE_DAMAGE
-        blue_knight.melee_cooldown = KNIGHT_MELEE_COOLDOWN
-        blue_knight.current_hp = blue_knight.max_hp
-        world.add_entity(blue_knight)
-
-        blue_archer = Archer_TeamA(
-            world,
-            blue_archer_image,
-            blue_arrow_image,
-            blue_base,
-            Vector2(blue_base.spawn_position),
-        )
-        blue_archer.team_id = 0
-        blue_archer.max_hp = ARCHER_MAX_HP
-        blue_archer.maxSpeed = ARCHER_MAX_SPEED
-        blue_archer.min_target_distance = ARCHER_MIN_TARGET_DISTANCE
-        blue_archer.projectile_range = ARCHER_PROJECTILE_RANGE
-        blue_archer.projectile_speed = ARCHER_PROJECTILE_SPEED
-        blue_archer.ranged_damage = ARCHER_RANGED_DAMAGE
-        blue_archer.ranged_cooldown = ARCHER_RANGED_COOLDOWN
-        blue_archer.current_hp = blue_archer.max_hp
-        world.add_entity(blue_archer)
-
-        blue_wizard = Wizard_TeamA(
-            world,
-            blue_wizard_image,
-            blue_rock_image,
-            blue_base,
-            Vector2(blue_base.spawn_position),
-            blue_explosion_image,
-        )
-        blue_wizard.team_id = 0
-        blue_wizard.max_hp = WIZARD_MAX_HP
-        blue_wizard.maxSpeed = WIZARD_MAX_SPEED
-        blue_wizard.min_target_distance = WIZARD_MIN_TARGET_DISTANCE
-        blue_wizard.projectile_range = WIZARD_PROJECTILE_RANGE
-        blue_wizard.projectile_speed = WIZARD_PROJECTILE_SPEED
-        blue_wizard.ranged_damage = WIZARD_RANGED_DAMAGE
-        blue_wizard.ranged_cooldown = WIZARD_RANGED_COOLDOWN
-        blue_wizard.current_hp = blue_wizard.max_hp
-        world.add_entity(blue_wizard)
-
-        # --- Initialize Red buildings and units ---
-        red_base = Base(world, red_base_image, red_orc_image, red_rock_image, 4, 0)
-        red_base.position = Vector2(SCREEN_WIDTH - 68, SCREEN_HEIGHT - 68)
-        red_base.team_id = 1
-        red_base.max_hp = BASE_MAX_HP * RED_MULTIPLIER
-        red_base.min_target_distance = BASE_MIN_TARGET_DISTANCE
-        red_base.projectile_range = BASE_PROJECTILE_RANGE
-        red_base.projectile_speed = BASE_PROJECTILE_SPEED
-        red_base.ranged_damage = BASE_RANGED_DAMAGE * RED_MULTIPLIER
-        red_base.ranged_cooldown = BASE_RANGED_COOLDOWN
-        red_base.current_hp = red_base.max_hp
-        red_base.brain.set_state("base_state")
-        world.add_entity(red_base)
-
-        red_tower_1 = Tower(world, red_tower_image, red_rock_image)
-        red_tower_1.position = Vector2(820, 660)
-        red_tower_1.team_id = 1
-        red_tower_1.max_hp = TOWER_MAX_HP * RED_MULTIPLIER
-        red_tower_1.min_target_distance = TOWER_MIN_TARGET_DISTANCE
-        red_tower_1.projectile_range = TOWER_PROJECTILE_RANGE
-        red_tower_1.projectile_speed = TOWER_PROJECTILE_SPEED
-        red_tower_1.ranged_damage = TOWER_RANGED_DAMAGE * RED_MULTIPLIER
-        red_tower_1.ranged_cooldown = TOWER_RANGED_COOLDOWN
-        red_tower_1.current_hp = red_tower_1.max_hp
-        red_tower_1.brain.set_state("tower_state")
-        world.add_entity(red_tower_1)
-
-        red_tower_2 = Tower(world, red_tower_image, red_rock_image)
-        red_tower_2.position = Vector2(910, 570)
-        red_tower_2.team_id = 1
-        red_tower_2.max_hp = TOWER_MAX_HP * RED_MULTIPLIER
-        red_tower_2.min_target_distance = TOWER_MIN_TARGET_DISTANCE
-        red_tower_2.projectile_range = TOWER_PROJECTILE_RANGE
-        red_tower_2.projectile_speed = TOWER_PROJECTILE_SPEED
-        red_tower_2.ranged_damage = TOWER_RANGED_DAMAGE * RED_MULTIPLIER
-        red_tower_2.ranged_cooldown = TOWER_RANGED_COOLDOWN
-        red_tower_2.current_hp = red_tower_2.max_hp
-        red_tower_2.brain.set_state("tower_state")
-        world.add_entity(red_tower_2)
-
-        red_knight = Knight_TeamB(
-            world, red_knight_image, red_base, Vector2(red_base.spawn_position)
-        )
-        red_knight.team_id = 1
-        red_knight.max_hp = KNIGHT_MAX_HP * RED_MULTIPLIER
-        red_knight.maxSpeed = KNIGHT_MAX_SPEED
-        red_knight.min_target_distance = KNIGHT_MIN_TARGET_DISTANCE
-        red_knight.melee_damage = KNIGHT_MELEE_DAMAGE * RED_MULTIPLIER
-        red_knight.melee_cooldown = KNIGHT_MELEE_COOLDOWN
-        red_knight.current_hp = red_knight.max_hp
-        world.add_entity(red_knight)
-
-        red_archer = Archer_TeamB(
-            world,
-            red_archer_image,
-            red_arrow_image,
-            red_base,
-            Vector2(red_base.spawn_position),
-        )
-        red_archer.team_id = 1
-        red_archer.max_hp = ARCHER_MAX_HP * RED_MULTIPLIER
-        red_archer.maxSpeed = ARCHER_MAX_SPEED
-        red_archer.min_target_distance = ARCHER_MIN_TARGET_DISTANCE
-        red_archer.projectile_range = ARCHER_PROJECTILE_RANGE
-        red_archer.projectile_speed = ARCHER_PROJECTILE_SPEED
-        red_archer.ranged_damage = ARCHER_RANGED_DAMAGE * RED_MULTIPLIER
-        red_archer.ranged_cooldown = ARCHER_RANGED_COOLDOWN
-        red_archer.current_hp = red_archer.max_hp
-        world.add_entity(red_archer)
-
-        red_wizard = Wizard_TeamB(
-            world,
-            red_wizard_image,
-            red_rock_image,
-            red_base,
-            Vector2(red_base.spawn_position),
-            red_explosion_image,
-        )
-        red_wizard.team_id = 1
-        red_wizard.max_hp = WIZARD_MAX_HP * RED_MULTIPLIER
-        red_wizard.maxSpeed = WIZARD_MAX_SPEED
-        red_wizard.min_target_distance = WIZARD_MIN_TARGET_DISTANCE
-        red_wizard.projectile_range = WIZARD_PROJECTILE_RANGE
-        red_wizard.projectile_speed = WIZARD_PROJECTILE_SPEED
-        red_wizard.ranged_damage = WIZARD_RANGED_DAMAGE * RED_MULTIPLIER
-        red_wizard.ranged_cooldown = WIZARD_RANGED_COOLDOWN
-        red_wizard.current_hp = red_wizard.max_hp
-        world.add_entity(red_wizard)
-
-        # --- Initialize other entities in the world ---
-        mountain_1 = Obstacle(world, mountain_image_1)
-        mountain_1.position = Vector2(410, 460)
-        mountain_1.team_id = 2
-        world.add_entity(mountain_1)
-        world.obstacles.append(mountain_1)
-
-        mountain_2 = Obstacle(world, mountain_image_2)
-        mountain_2.position = Vector2(620, 280)
-        mountain_2.team_id = 2
-        world.add_entity(mountain_2)
-        world.obstacles.append(mountain_2)
-
-        plateau = Obstacle(world, plateau_image)
-        plateau.position = Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-        plateau.team_id = 2
-        world.add_entity(plateau)
-        world.obstacles.append(plateau)
-
-        grey_tower = Tower(world, grey_tower_image, grey_projectile_image)
-        grey_tower.position = Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 10)
-        grey_tower.team_id = 2
-        grey_tower.min_target_distance = GREY_TOWER_MIN_TARGET_DISTANCE
-        grey_tower.projectile_range = GREY_TOWER_PROJECTILE_RANGE
-        grey_tower.projectile_speed = GREY_TOWER_PROJECTILE_SPEED
-        grey_tower.ranged_damage = GREY_TOWER_RANGED_DAMAGE
-        grey_tower.ranged_cooldown = GREY_TOWER_RANGED_COOLDOWN
-        grey_tower.brain.set_state("tower_state")
-        world.add_entity(grey_tower)
-
         # Splash screen
 
         if SHOW_SPLASH:
@@ -644,7 +819,7 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
                     break
 
                 screen.blit(world.background, (0, 0))
-                font = pygame.font.SysFont("arial", 60, True)
+                font = get_font("arial", 60, True)
 
                 title = font.render("Heroes of Ancient Legends", True, (0, 255, 255))
                 screen.blit(title, (w // 2 - title.get_width() // 2, 100))
@@ -657,6 +832,7 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
 
                 pygame.display.update()
 
+        renderer = DirtyRenderer(world) if DIRTY_RENDERING else None
         clock = pygame.time.Clock()
         frame_step = 0
         while True:
@@ -678,15 +854,21 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
                     # this should allow the game to run at faster pace
                     time_passed = 1000 / 30
 
-                world.process(time_passed)
+                world.step(1, time_passed)
                 log_metrics(world, log, frame_step)
 
-            world.render(screen)
-            pygame.display.update()
+            # render every RENDER_EVERY frames, or never if 0
+            if RENDER_EVERY > 0 and frame_step % RENDER_EVERY == 0:
+                if renderer is None:
+                    world.render(screen)
+                    pygame.display.update()
+                else:
+                    pygame.display.update(renderer.render(screen))
 
-            # record each game frame using camera
-            img_data = pygame.image.tostring(screen, "RGB")
-            camera.record(img_data, frame_step)
+                # record rendered game frames using camera, if it needs them
+                if camera.needs_frames:
+                    img_data = pygame.image.tostring(screen, "RGB")
+                    camera.record(img_data, frame_step)
             frame_step += 1
 
             # exit game automatically in headless mode
@@ -701,6 +883,38 @@ def run(log=loggers[LOGGER](), camera=cameras[CAMERA](RECORDING_PATH)):
             ),
         )
 
+        # report path cache effectiveness
+        path_cache = getPathCache()
+        if path_cache is not None:
+            print(
+                PATH_CACHE_HEADER,
+                f"hits: {path_cache.hits} misses: {path_cache.misses}",
+                f"routed: {path_cache.routed}",
+            )
+            log.metrics(
+                metric_map={
+                    "path_cache_hits": path_cache.hits,
+                    "path_cache_misses": path_cache.misses,
+                    "path_cache_routed": path_cache.routed,
+                },
+                step=frame_step,
+            )
+
+        # report line of sight cache effectiveness
+        los_cache = world.line_of_sight_cache
+        if los_cache is not None:
+            print(
+                LOS_CACHE_HEADER,
+                f"hits: {los_cache.hits} misses: {los_cache.misses}",
+            )
+            log.metrics(
+                metric_map={
+                    "los_cache_hits": los_cache.hits,
+                    "los_cache_misses": los_cache.misses,
+                },
+                step=frame_step,
+            )
+
         # save recording and upload with logger
         camera.export()
         log.file(RECORDING_PATH)
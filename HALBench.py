@@ -0,0 +1,542 @@
+#
+# NP AIG Assignment 1
+# Micro-benchmarks for HAL's hot paths
+#
+
+import os
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from functools import partial
+
+# benchmarks never need a window: use pygame's dummy video driver
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+from Globals import SCREEN_SIZE
+
+## Benchmark Settings
+# no. of times each benchmark statement is repeated, best timing is reported
+N_REPEATS = int(os.environ.get("BENCH_REPEATS", default=5))
+# no. of times each benchmark statement is executed per repeat
+N_NUMBER = int(os.environ.get("BENCH_NUMBER", default=20))
+
+
+def scan_connections(graph, fromNode):
+    """
+    Reference getConnections() implementation that scans every edge in the graph
+    """
+    return [con for con in graph.connections if con.fromNode.id == fromNode.id]
+
+
+def scan_has_connection(graph, fromNode, toNode):
+    """
+    Reference hasConnection() implementation that scans every edge in the graph
+    """
+    return any(
+        con.fromNode.id == fromNode.id and con.toNode.id == toNode.id
+        for con in graph.connections
+    )
+
+
+class ObjectNode:
+    """
+    Reference Node holding its position & a list of its connections
+    """
+
+    __slots__ = ("id", "graph", "position", "connections")
+
+    def __init__(self, graph, id, position):
+        self.id = id
+        self.graph = graph
+        self.position = position
+        self.connections = []
+
+
+class ObjectConnection:
+    """
+    Reference Connection holding its cost & references to its nodes
+    """
+
+    __slots__ = ("graph", "cost", "fromNode", "toNode")
+
+    def __init__(self, graph, cost, fromNode, toNode):
+        self.graph = graph
+        self.cost = cost
+        self.fromNode = fromNode
+        self.toNode = toNode
+
+
+def object_graph(graph):
+    """
+    Reference Graph storage copying the given graph into a dictionary of Node objects,
+    each with a list of Connection objects, and the graph's list of all connections
+    """
+    nodes = {
+        node.id: ObjectNode(graph, node.id, node.position)
+        for node in graph.nodes.values()
+    }
+    connections = []
+    for con in graph.connections:
+        connection = ObjectConnection(
+            graph, con.cost, nodes[con.fromNode.id], nodes[con.toNode.id]
+        )
+        connection.fromNode.connections.append(connection)
+        connections.append(connection)
+    return nodes, connections
+
+
+def scan_nearest_node(graph, position):
+    """
+    Reference get_nearest_node() implementation that scans every node in the graph
+    """
+    return min(
+        graph.nodes.values(),
+        key=lambda node: (position - pygame.Vector2(node.position)).length(),
+    )
+
+
+def record_astar(graph, start, end):
+    """
+    Reference pathFindAStar() implementation searching over Node & Connection objects
+    """
+    import heapq
+    from Graph import NodeRecord, heuristic
+
+    open_list = {start.id: NodeRecord(start, None, 0, heuristic(graph, start, end))}
+    open_heap = [(open_list[start.id].estimatedCost, 0, start.id)]
+    closed_list = {}
+    n_opened = 1
+    current = None
+    while open_heap:
+        node_id = heapq.heappop(open_heap)[2]
+        if node_id not in open_list:
+            continue
+        current = open_list.pop(node_id)
+        if current.node.id == end.id:
+            break
+        for con in graph.getConnections(current.node):
+            to_node = con.toNode
+            to_cost = current.costSoFar + con.cost
+            if to_node.id in closed_list:
+                continue
+            if to_node.id in open_list:
+                record = open_list[to_node.id]
+                if record.costSoFar <= to_cost:
+                    continue
+            else:
+                record = NodeRecord(to_node, None, None, None)
+                open_list[to_node.id] = record
+            record.connection = con
+            record.costSoFar = to_cost
+            record.estimatedCost = to_cost + heuristic(graph, to_node, end)
+            heapq.heappush(open_heap, (record.estimatedCost, n_opened, to_node.id))
+            n_opened += 1
+        closed_list[current.node.id] = current
+
+    if current is None or current.node.id != end.id:
+        return None
+    path = []
+    while current.node.id != start.id:
+        path.append(current.connection)
+        current = closed_list[current.connection.fromNode.id]
+    return path[::-1]
+
+
+def ray_entity_line_of_sight(entity, target, step_dist=10, ray_width=26):
+    """
+    Reference line_of_sight() implementation colliding a ray entity with obstacles
+    """
+    from GameEntity import GameEntity
+    from World_Ext import detect_collisions
+
+    ray = GameEntity(entity.world, "ray", pygame.Surface((ray_width, step_dist)))
+    ray.mask.fill()
+    ray.position = entity.position
+    while (pygame.Vector2(target.position) - ray.position).length() > 0:
+        disp = target.position - ray.position
+        ray.position = ray.position + disp.normalize() * min(step_dist, disp.length())
+        ray.sync_rect(ray.position)
+        collisions = detect_collisions(ray, {"obstacle"}, any_one=True)
+        if len(collisions) > 0 and collisions[0][0].id != target.id:
+            return False
+    return True
+
+
+@contextmanager
+def without_routes(graph):
+    """
+    Temporarily hide the graph's precomputed routes, forcing pathFindAStar() to search.
+    """
+    route_next, route_costs = graph.routeNext, graph.routeCosts
+    graph.routeNext, graph.routeCosts = None, None
+    try:
+        yield graph
+    finally:
+        graph.routeNext, graph.routeCosts = route_next, route_costs
+
+
+def bench(stmt):
+    """
+    Time the given callable, returning the best time per call in microseconds.
+    """
+    timings = timeit.repeat(stmt, repeat=N_REPEATS, number=N_NUMBER)
+    return min(timings) / N_NUMBER * 1e6
+
+
+def measure_memory(build):
+    """
+    Build an object with the given callable, returning the memory in bytes it holds on to.
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        built = build()
+        return tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+
+def report(name, old_us, new_us):
+    """
+    Print a single benchmark result comparing old & new timings.
+    """
+    print(
+        f"{name:<48} old: {old_us:>10.1f}us new: {new_us:>10.1f}us "
+        f"speedup: {old_us / new_us:>6.1f}x"
+    )
+
+
+def report_memory(name, old_bytes, new_bytes):
+    """
+    Print a single benchmark result comparing old & new memory usage.
+    """
+    print(
+        f"{name:<48} old: {old_bytes / 1024:>10.1f}KB new: {new_bytes / 1024:>10.1f}KB "
+        f"reduction: {old_bytes / new_bytes:>4.1f}x"
+    )
+
+
+def bench_graph(name, graph):
+    """
+    Compare connection lookups & A* on the given graph with edge scanning vs the adjacency index.
+    """
+    from Graph import pathFindAStar
+
+    nodes = list(graph.nodes.values())
+    pairs = [(c.fromNode, c.toNode) for c in graph.connections]
+
+    def all_connections(get_connections):
+        for node in nodes:
+            get_connections(node)
+
+    def all_has_connection(has_connection):
+        for from_node, to_node in pairs:
+            has_connection(from_node, to_node)
+
+    report(
+        f"{name}: getConnections() x{len(nodes)}",
+        bench(partial(all_connections, partial(scan_connections, graph))),
+        bench(partial(all_connections, graph.getConnections)),
+    )
+    report(
+        f"{name}: hasConnection() x{len(pairs)}",
+        bench(partial(all_has_connection, partial(scan_has_connection, graph))),
+        bench(partial(all_has_connection, graph.hasConnection)),
+    )
+
+    # a* between the first & last nodes of the graph: node records vs the compact graph
+    start, end = nodes[0], nodes[-1]
+    graph.getCompact()  # build the compact graph outside of timings
+    with without_routes(graph):
+        report(
+            f"{name}: pathFindAStar()",
+            bench(partial(record_astar, graph, start, end)),
+            bench(partial(pathFindAStar, graph, start, end)),
+        )
+
+
+def bench_graph_memory(name, interval_dist, graph):
+    """
+    Compare the memory held by the given graph interpolated every interval_dist
+    stored as Node & Connection objects vs stored in arrays with its connection index.
+    """
+    interp_graph = graph.interpolate(interval_dist)
+
+    def compact_graph():
+        interp_graph = graph.interpolate(interval_dist)
+        interp_graph.getCompact()
+        return interp_graph
+
+    report_memory(
+        f"{name}: {len(interp_graph.nodes)} nodes memory",
+        measure_memory(partial(object_graph, interp_graph)),
+        measure_memory(compact_graph),
+    )
+
+
+def bench_nearest_node(name, graph):
+    """
+    Compare nearest node queries scanning every node vs the spatial node index.
+    """
+    from random import Random
+
+    rng = Random(0)
+    positions = [
+        pygame.Vector2(rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1]))
+        for _ in range(100)
+    ]
+
+    def all_nearest(get_nearest_node):
+        for position in positions:
+            get_nearest_node(position)
+
+    graph.get_nearest_node(positions[0])  # build the index outside of timings
+    report(
+        f"{name}: get_nearest_node() x{len(positions)}",
+        bench(partial(all_nearest, partial(scan_nearest_node, graph))),
+        bench(partial(all_nearest, graph.get_nearest_node)),
+    )
+
+
+def bench_routes(name, graph):
+    """
+    Compare routing between every pair of nodes with a* search vs precomputed routes.
+    """
+    from Graph import pathFindAStar
+
+    nodes = list(graph.nodes.values())
+
+    def all_routes():
+        for start in nodes:
+            for end in nodes:
+                pathFindAStar(graph, start, end)
+
+    with without_routes(graph):
+        old_us = bench(all_routes)
+    report(f"{name}: precomputed routes x{len(nodes) ** 2}", old_us, bench(all_routes))
+
+
+def bench_hierarchical(name, coarse, fine):
+    """
+    Compare pathfinding between random nodes of the fine graph with a* search vs
+    planning on the coarse graph & refining on the fine graph.
+    """
+    from random import Random
+    from Graph import pathFindAStar, pathFindHierarchical
+
+    rng = Random(0)
+    nodes = list(fine.nodes.values())
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(100)]
+
+    def all_paths(find_path):
+        for start, end in pairs:
+            find_path(start, end)
+
+    pathFindHierarchical(
+        coarse, fine, *pairs[0]
+    )  # build the compact graph outside of timings
+    report(
+        f"{name}: pathFindHierarchical() x{len(pairs)}",
+        bench(partial(all_paths, partial(pathFindAStar, fine))),
+        bench(partial(all_paths, partial(pathFindHierarchical, coarse, fine))),
+    )
+
+
+def bench_spatial_hash(n_entities):
+    """
+    Compare radius & nearest queries over many entities scanning every entity vs the spatial hash.
+    """
+    from random import Random
+    from GameEntity import GameEntity
+    from SpatialHash import SpatialHash
+
+    rng = Random(0)
+    spatial_hash = SpatialHash()
+    entities = []
+    for entity_id in range(n_entities):
+        entity = GameEntity(None, "orc", None)
+        entity.id = entity_id
+        entity.position = pygame.Vector2(
+            rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1])
+        )
+        spatial_hash.insert(entity)
+        entities.append(entity)
+    queriers = entities[:100]
+
+    def scan_query(position, radius):
+        return [e for e in entities if (e.position - position).length() <= radius]
+
+    def scan_nearest(position):
+        return min(entities, key=lambda e: (position - e.position).length())
+
+    report(
+        f"{n_entities} entities: radius query x{len(queriers)}",
+        bench(lambda: [scan_query(e.position, 100) for e in queriers]),
+        bench(lambda: [spatial_hash.query(e.position, 100) for e in queriers]),
+    )
+    report(
+        f"{n_entities} entities: nearest query x{len(queriers)}",
+        bench(lambda: [scan_nearest(e.position) for e in queriers]),
+        bench(lambda: [spatial_hash.nearest(e.position) for e in queriers]),
+    )
+
+
+def bench_rect_grid(n_entities):
+    """
+    Compare mask collisions of projectiles against every entity vs against the
+    entities overlapping their rects in the rect grid.
+    """
+    from random import Random
+    from GameEntity import GameEntity
+    from SpatialHash import RectGrid
+
+    rng = Random(0)
+    image = pygame.Surface((32, 32), pygame.SRCALPHA)
+    image.fill((255, 255, 255, 255))
+    rect_grid = RectGrid()
+    entities = []
+    for entity_id in range(n_entities):
+        entity = GameEntity(None, "orc", image)
+        entity.id = entity_id
+        entity.sync_rect(
+            (rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1]))
+        )
+        rect_grid.insert(entity)
+        entities.append(entity)
+    projectiles = entities[:100]
+
+    def collide_all(get_candidates):
+        for projectile in projectiles:
+            pygame.sprite.spritecollide(
+                projectile,
+                get_candidates(projectile),
+                False,
+                pygame.sprite.collide_mask,
+            )
+
+    report(
+        f"{n_entities} entities: mask collisions x{len(projectiles)}",
+        bench(partial(collide_all, lambda projectile: entities)),
+        bench(
+            partial(collide_all, lambda projectile: rect_grid.query(projectile.rect))
+        ),
+    )
+
+
+def bench_line_of_sight(n_frames):
+    """
+    Compare line of sight checks between opponents after simulating frames of a game
+    colliding a ray entity with obstacles vs ray casts over the occupancy map.
+    """
+    from random import seed
+    from HAL import create_world
+
+    seed(0)
+    world = create_world()
+    world.step(n_frames)
+    entities = list(world.entities.values())
+    pairs = [
+        (entity, target)
+        for entity in entities
+        for target in entities
+        if entity.team_id != target.team_id
+        and target.name not in {"obstacle", "projectile", "explosion"}
+        and (entity.position - target.position).length() <= 300
+    ]
+
+    report(
+        f"frame {n_frames}: line of sight x{len(pairs)}",
+        bench(lambda: [ray_entity_line_of_sight(e, t) for e, t in pairs]),
+        # cast rays directly: line_of_sight() would answer from the cache
+        bench(lambda: [world.line_of_sight.ray_cast(e.position, t) for e, t in pairs]),
+    )
+
+
+def bench_visibility(name, graph_of):
+    """
+    Compare line of sight checks between every pair of nodes of a graph casting
+    rays vs looking up the world's node visibility matrix.
+    """
+    from random import seed
+    from HAL import create_world
+
+    seed(0)
+    world = create_world()
+    # obstacles are positioned as they are first processed
+    world.step(1)
+    graph = graph_of(world)
+    matrix = world.get_visibility_matrix(graph)
+    nodes = list(graph.nodes.values())[:100]
+    line_of_sight = world.line_of_sight
+
+    report(
+        f"{name}: node visibility x{len(nodes) ** 2}",
+        bench(
+            lambda: [
+                line_of_sight.ray_cast(pygame.Vector2(a.position), b) is None
+                for a in nodes
+                for b in nodes
+            ]
+        ),
+        bench(lambda: [matrix.can_see(a, b) for a in nodes for b in nodes]),
+    )
+
+
+def bench_simulation(n_frames):
+    """
+    Compare simulating frames of a game rendering & capturing each frame vs World.step().
+    """
+    from random import seed
+    from HAL import create_world
+
+    screen = pygame.display.get_surface()
+
+    def render_frames():
+        world = create_world()
+        for _ in range(n_frames):
+            world.process(1000 / 30)
+            world.render(screen)
+            pygame.display.update()
+            pygame.image.tostring(screen, "RGB")
+
+    def step_frames():
+        world = create_world()
+        world.step(n_frames)
+
+    seed(0)
+    old_us = bench(render_frames)
+    seed(0)
+    report(f"simulation: World.step() x{n_frames}", old_us, bench(step_frames))
+
+
+if __name__ == "__main__":
+    pygame.init()
+    pygame.display.set_mode(SCREEN_SIZE, 0, 32)
+
+    from HAL import World
+    from World_Ext import interpolate_graph
+
+    world = World()
+    print(f"Benchmarking best of {N_REPEATS} repeats x {N_NUMBER} runs")
+    bench_graph("world graph", world.graph)
+    interp_graph = interpolate_graph(world.graph)
+    bench_graph("interpolated graph", interp_graph)
+    bench_graph_memory("interpolated graph", 20, world.graph)
+    bench_graph_memory("dense interpolated graph", 5, world.graph)
+    bench_nearest_node("world graph", world.graph)
+    bench_nearest_node("interpolated graph", interp_graph)
+    bench_routes("world graph", world.graph)
+    bench_routes("orc path graph", world.paths[-1])
+    bench_hierarchical("interpolated graph", world.graph, interp_graph)
+    bench_spatial_hash(30)
+    bench_spatial_hash(1000)
+    bench_rect_grid(30)
+    bench_rect_grid(1000)
+    bench_line_of_sight(300)
+    bench_visibility("world graph", lambda world: world.graph)
+    bench_visibility(
+        "interpolated graph",
+        lambda world: world.get_interpolated_graph(world.graph),
+    )
+    bench_simulation(30)
@@ -15,7 +15,16 @@ from multiprocessing.pool import Pool
 from tempfile import NamedTemporaryFile
 from statsmodels.stats.proportion import proportion_confint
 
-from Globals import TEAM_NAME, PARAMS, FINAL_SCORE_HEADER, MLFLOW_RUN
+from Globals import (
+    TEAM_NAME,
+    PARAMS,
+    FINAL_SCORE_HEADER,
+    PATH_CACHE_HEADER,
+    LOS_CACHE_HEADER,
+    MLFLOW_RUN,
+)
+from map_bundle import compile_map_bundle, load_map_bundle
+from sprite_atlas import compile_sprite_atlas, load_sprite_atlas
 
 ## Experiment Settings
 # no. of game trials to run for the experiment
@@ -37,13 +46,29 @@ RUN_ENV_OVERRIDES = {
     "HEADLESS": "True",
     "LOGGER": "NOPLogger",
     "CAMERA": "NOPCamera",
+    "RENDER_EVERY": "0",
     "RED_WIN_NONZERO_STATUS": "False",
 }
 
 
+def extract_cache_stats(out_lines, header):
+    """
+    Extract the cache hits & misses reported in game stdout after the given header,
+    or None if the cache was not reported.
+    """
+    cache_lines = [l for l in out_lines if header in l]
+    return (
+        [int(t) for t in cache_lines[0].split(" ") if str.isdigit(t)]
+        if cache_lines
+        else None
+    )
+
+
 def run_trial(rng_seed):
     """
     Run one trial of HAL and return result and scores of teams using the given RNG seed
+    Also returns the path cache hits, misses & routed paths and the line of sight
+    cache hits & misses, each None if the cache is disabled.
     """
     # run game via subprocess as pygame does not handle concurrency well
     run_env = {**os.environ, **RUN_ENV_OVERRIDES, "RANDOM_SEED": f"{rng_seed}"}
@@ -66,7 +91,11 @@ def run_trial(rng_seed):
     scores = [
         int(t) for t in match_lines[0].replace(":", "").split(" ") if str.isdigit(t)
     ]
-    return scores
+
+    # extract cache hits & misses from game stdout if reported
+    path_cache_stats = extract_cache_stats(out_lines, PATH_CACHE_HEADER)
+    los_cache_stats = extract_cache_stats(out_lines, LOS_CACHE_HEADER)
+    return scores, path_cache_stats, los_cache_stats
 
 
 def compute_statistics(scores):
@@ -176,6 +205,13 @@ def print_results(scores, stats, seeds, file=sys.stdout):
 
 
 if __name__ == "__main__":
+    # compile the map bundle once up front instead of parsing map files in every trial
+    if load_map_bundle() is None:
+        compile_map_bundle()
+    # likewise the sprite atlas instead of loading every sprite's image file
+    if load_sprite_atlas() is None:
+        compile_sprite_atlas()
+
     # log trial to MLFlow
     mlflow.set_experiment(MLFLOW_EXPERIMENT)
     with mlflow.start_run(run_name=MLFLOW_RUN), Pool(
@@ -196,9 +232,12 @@ if __name__ == "__main__":
         # since the seed has be be rendered by MLFlow using JS,
         # make sure seed stays within JS's Number.MAX_SAFE_INTEGER
         seeds = [randint(0, 2 ** 53) for _ in range(N_TRIALS)]
-        scores = list(tqdm(pool.imap(run_trial, seeds), total=N_TRIALS))
+        results = list(tqdm(pool.imap(run_trial, seeds), total=N_TRIALS))
+        scores = [score for score, _, _ in results]
 
-        for i_trial, score, seed in zip(range(N_TRIALS), scores, seeds):
+        for i_trial, (score, path_cache_stats, los_cache_stats), seed in zip(
+            range(N_TRIALS), results, seeds
+        ):
             # log scores for each trial
             mlflow.log_metrics(
                 metrics={
@@ -208,6 +247,25 @@ if __name__ == "__main__":
                 },
                 step=i_trial,
             )
+            # log path cache effectiveness for each trial if enabled
+            if path_cache_stats is not None:
+                mlflow.log_metrics(
+                    metrics={
+                        "path_cache_hits": path_cache_stats[0],
+                        "path_cache_misses": path_cache_stats[1],
+                        "path_cache_routed": path_cache_stats[2],
+                    },
+                    step=i_trial,
+                )
+            # log line of sight cache effectiveness for each trial if enabled
+            if los_cache_stats is not None:
+                mlflow.log_metrics(
+                    metrics={
+                        "los_cache_hits": los_cache_stats[0],
+                        "los_cache_misses": los_cache_stats[1],
+                    },
+                    step=i_trial,
+                )
 
         # log game trial wins to MLFlow
         stats = compute_statistics(scores)
@@ -0,0 +1,164 @@
+#
+# NP AIG Assignment 1
+# Structure of arrays store of entities' kinematic state
+#
+
+import numpy as np
+from typing import List, Tuple
+
+# scalar fields kept in the store, with their array dtypes
+KINEMATIC_FIELDS = {
+    "current_hp": np.float64,
+    "current_melee_cooldown": np.float64,
+    "current_ranged_cooldown": np.float64,
+    "current_healing_cooldown": np.float64,
+    "current_respawn_time": np.float64,
+    "ko": np.bool_,
+}
+
+
+class KinematicField:
+    """
+    Attribute of an entity that is a view into the world's kinematic store while
+    the entity has a slot in the store, and a plain instance attribute otherwise.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        slot = entity.kinematic_slot
+        if slot is None:
+            try:
+                return entity.__dict__[self.name]
+            except KeyError:
+                raise AttributeError(self.name) from None
+        # convert from numpy scalars so values behave like the plain attributes
+        return entity.world.kinematics.fields[self.name][slot].item()
+
+    def __set__(self, entity, value):
+        slot = entity.kinematic_slot
+        if slot is None:
+            entity.__dict__[self.name] = value
+        else:
+            entity.world.kinematics.fields[self.name][slot] = value
+
+
+class Kinematics:
+    """
+    Kinematic state of the world's entities stored as a structure of arrays, one row
+    per entity slot, so that integration, the screen bounds check & cooldown countdowns
+    of every entity each run as one NumPy step.
+
+    Scalar fields (see KINEMATIC_FIELDS) are views into the store through KinematicField.
+    Positions & velocities stay pygame Vector2s on the entities: a Vector2 owns its
+    storage & is mutated in place (eg. normalize_ip()), so it cannot alias a row of
+    the store. Instead they are gathered into the store before each step and the
+    integrated positions are returned to be scattered back onto the entities.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.position = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float64)
+        self.fields = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in KINEMATIC_FIELDS.items()
+        }
+        # fields set on the entity in each slot, None if the slot is free
+        self.slot_fields: List = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        """
+        Double the capacity of the store.
+        """
+        capacity = len(self.slot_fields)
+        self.position = np.concatenate([self.position, np.zeros_like(self.position)])
+        self.velocity = np.concatenate([self.velocity, np.zeros_like(self.velocity)])
+        self.fields = {
+            name: np.concatenate([values, np.zeros_like(values)])
+            for name, values in self.fields.items()
+        }
+        self.slot_fields.extend([None] * capacity)
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def insert(self, entity):
+        """
+        Give the entity a slot in the store, moving its kinematic fields into the store.
+        """
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        names = [name for name in KINEMATIC_FIELDS if name in entity.__dict__]
+        for name, values in self.fields.items():
+            # fields the entity does not have are zero, which no step ever counts down
+            values[slot] = entity.__dict__.pop(name, 0)
+        self.slot_fields[slot] = names
+        entity.kinematic_slot = slot
+
+    def remove(self, entity):
+        """
+        Free the entity's slot, moving its kinematic fields back onto the entity.
+        """
+        slot = entity.kinematic_slot
+        for name in self.slot_fields[slot]:
+            entity.__dict__[name] = self.fields[name][slot].item()
+        self.slot_fields[slot] = None
+        self.free.append(slot)
+        entity.kinematic_slot = None
+
+    def step(
+        self, entities: List, time_passed: float, bounds: Tuple[float, float]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Integrate the positions of the given entities over time_passed & count down
+        their cooldowns. Returns, in the order of the given entities:
+        - integrated positions
+        - positions with the integration undone, for entities that cannot move there
+        - whether each integrated position is outside of the given (width, height) bounds
+        """
+        slots = np.fromiter(
+            (entity.kinematic_slot for entity in entities), dtype=np.int64
+        )
+        self.position[slots] = [
+            (entity.position[0], entity.position[1]) for entity in entities
+        ]
+        self.velocity[slots] = [
+            (entity.velocity[0], entity.velocity[1]) for entity in entities
+        ]
+
+        displacement = self.velocity[slots] * time_passed
+        moved = self.position[slots] + displacement
+        undone = moved - displacement
+        outside = (
+            (moved[:, 0] < 0)
+            | (moved[:, 0] > bounds[0])
+            | (moved[:, 1] < 0)
+            | (moved[:, 1] > bounds[1])
+        )
+        self.position[slots] = moved
+
+        self.count_down(slots, time_passed)
+        return moved, undone, outside
+
+    def count_down(self, slots: np.ndarray, time_passed: float):
+        """
+        Count down the cooldowns & respawn times of the entities in the given slots.
+        """
+        melee, ranged, healing, respawn = (
+            self.fields["current_melee_cooldown"],
+            self.fields["current_ranged_cooldown"],
+            self.fields["current_healing_cooldown"],
+            self.fields["current_respawn_time"],
+        )
+        # healing cooldown is counted down on top of the melee & ranged cooldowns
+        cooling = healing[slots] > 0
+        healing[slots[cooling]] -= time_passed
+        attack_slots = slots[~cooling]
+        for cooldown in (melee, ranged):
+            cooldown[attack_slots[cooldown[attack_slots] > 0]] -= time_passed
+
+        ko_slots = slots[self.fields["ko"][slots]]
+        respawn[ko_slots] -= time_passed
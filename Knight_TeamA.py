@@ -95,7 +95,7 @@ class KnightStateSeeking_TeamA(State):
 
         nearest_node = self.knight.path_graph.get_nearest_node(self.knight.position)
 
-        self.path = pathFindAStar(
+        self.path = pathFindFlowField(
             self.knight.path_graph,
             nearest_node,
             self.knight.path_graph.nodes[self.knight.base.target_node_index],
@@ -282,18 +282,9 @@ def enemies_targetting(chara, world):
 
     enemies = []
 
-    for entity in world.entities.values():
-
-        # neutral entity
-        if entity.team_id == 2:
-            continue
-
-        # same team
-        if entity.team_id == chara.team_id:
-            continue
-
-        if entity.name == "projectile" or entity.name == "explosion":
-            continue
+    # only the opposing team's non projectile entities
+    opponent_partitions = world.get_opponent_partitions(chara.team_id)
+    for entity in world.get_partition_entities(opponent_partitions):
 
         if entity.ko:
             continue
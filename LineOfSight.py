@@ -0,0 +1,395 @@
+#
+# NP AIG Assignment 1
+# Line of sight ray casts over the occupancy map of the world's obstacles
+#
+
+import numpy as np
+from math import ceil, floor, hypot
+import pygame
+from pygame import Vector2
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from Globals import SCREEN_WIDTH, SCREEN_HEIGHT
+
+# names of the entities rasterized by the occupancy map that rays can be cast against:
+# every entity with these names is one of the world's obstacles
+RAY_CAST_NAMES = frozenset({"obstacle"})
+# margin around the screen covered by summed-area tables, in pixels
+SCREEN_MARGIN = 64
+# max no. of rays cast at once when computing visibility matrices
+VISIBILITY_CHUNK_SIZE = 65536
+
+
+class LineOfSight:
+    """
+    Casts the "rays of light" of World_Ext.line_of_sight() over the occupancy map of
+    the world's obstacles, instead of colliding a ray entity with every obstacle's mask.
+
+    A ray is a filled ray_width x step_dist rect stepped step_dist at a time towards
+    its target, so it is blocked at a step if any occupied pixel of the map lies in
+    its rect. Each step is tested with 4 lookups into a summed-area table of the map,
+    counting its occupied pixels in any rect at once.
+    The ray is sampled at exactly the same steps & rects as line_of_sight() samples,
+    rather than traversed cell by cell as with DDA/Bresenham: traversing the pixels
+    under its line would sweep a thinner, continuous ray & change which targets
+    are in sight.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        # arrays of the occupancy map, the summed-area tables built from them & the
+        # screen positions of the tables' top left corners by obstacle names
+        self.summed_areas: Dict[FrozenSet[str], Tuple] = {}
+        # sizes of the ray rects by (ray_width, step_dist)
+        self.ray_sizes: Dict[Tuple[float, float], Tuple[int, int]] = {}
+
+    def can_ray_cast(self, target, collide_with: Iterable[str]) -> bool:
+        """
+        Whether rays towards the given target can be cast over the occupancy map
+        when colliding with entities of collide_with names.
+        Rays cannot be cast when colliding with entities that are not rasterized
+        or at rasterized targets, which rays must pass through.
+        Graph nodes are never rasterized, even if they share an obstacle's id.
+        """
+        collide_names = frozenset(collide_with)
+        return (
+            collide_names <= RAY_CAST_NAMES
+            and getattr(target, "name", None) not in collide_names
+        )
+
+    def get_summed_area(
+        self, names: Iterable[str]
+    ) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Get the summed-area table of the occupancy map of the obstacles with the
+        given names, with the screen position of its top left corner.
+        Entry (y, x) of the table counts the occupied pixels above & left of (y, x).
+        """
+        names = frozenset(names)
+        array, origin = self.world.occupancy.get_array(names=names)
+        # rebuild the table when the occupancy map was rebuilt
+        if names not in self.summed_areas or self.summed_areas[names][0] is not array:
+            # the table also covers the screen & a margin around it, so that rays
+            # between positions on screen can be looked up without clipping
+            height, width = array.shape
+            bounds = pygame.Rect(origin, (width, height)).union(
+                pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT).inflate(
+                    2 * SCREEN_MARGIN, 2 * SCREEN_MARGIN
+                )
+            )
+            occupied = np.zeros((bounds.height, bounds.width), dtype=np.int32)
+            x, y = origin[0] - bounds.x, origin[1] - bounds.y
+            occupied[y : y + height, x : x + width] = array
+            summed_area = np.zeros((bounds.height + 1, bounds.width + 1), np.int32)
+            summed_area[1:, 1:] = occupied.cumsum(axis=0).cumsum(axis=1)
+            self.summed_areas[names] = (array, summed_area, bounds.topleft)
+        return self.summed_areas[names][1:]
+
+    def get_ray_size(self, ray_width: float, step_dist: float) -> Tuple[int, int]:
+        """
+        Get the size of the ray rect of the given width & step distance, sized
+        as line_of_sight() sizes its ray's surface.
+        """
+        size = self.ray_sizes.get((ray_width, step_dist))
+        if size is None:
+            size = pygame.Surface((ray_width, step_dist)).get_size()
+            self.ray_sizes[(ray_width, step_dist)] = size
+        return size
+
+    def ray_cast(
+        self,
+        position: Vector2,
+        target,
+        step_dist: float = 10,
+        ray_width: float = 26,
+        collide_with: Iterable[str] = RAY_CAST_NAMES,
+    ) -> Optional[Vector2]:
+        """
+        Cast a ray from position towards the given target, entity or graph node,
+        colliding with the entities of collide_with names, which must be rasterized
+        (see can_ray_cast()).
+        Returns the position of the ray at the first step it was blocked at,
+        or None if the ray reached the target.
+        """
+        summed_area, origin = self.get_summed_area(collide_with)
+        w, h = self.get_ray_size(ray_width, step_dist)
+
+        # rays far from any occupied pixel are never blocked: skip stepping them if
+        # the area swept by the ray, padded to cover rounding, is unoccupied
+        (x1, y1), (x2, y2) = position, target.position
+        swept = (
+            floor(min(x1, x2) - w / 2) - 1,
+            floor(min(y1, y2) - h / 2) - 1,
+            ceil(max(x1, x2) + w / 2) + 1,
+            ceil(max(y1, y2) + h / 2) + 1,
+        )
+        if count_occupied(summed_area, origin, *swept) == 0:
+            return None
+        # steps of rays within the table can be looked up without clipping
+        height, width = summed_area.shape[0] - 1, summed_area.shape[1] - 1
+        left, top = swept[0] - origin[0], swept[1] - origin[1]
+        right, bottom = swept[2] - origin[0], swept[3] - origin[1]
+        if 0 <= left and 0 <= top and right <= width and bottom <= height:
+            count = count_occupied_unclipped
+        else:
+            count = count_occupied
+
+        # step the ray as line_of_sight() does, so its positions are exactly the same,
+        # positioning its rect at each step as GameEntity.sync_rect() does
+        rect = pygame.Rect(0, 0, w, h)
+        ray_position = position
+        target_position = Vector2(target.position)
+        disp = target_position - ray_position
+        while disp.length() > 0:
+            heading = disp.normalize()
+            ray_position = ray_position + heading * min(step_dist, disp.length())
+            rect.x, rect.y = ray_position[0] - w / 2, ray_position[1] - h / 2
+            if count(summed_area, origin, *rect.topleft, *rect.bottomright):
+                return ray_position
+            disp = target_position - ray_position
+        return None
+
+    def ray_cast_all(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        step_dist: float = 10,
+        ray_width: float = 26,
+        collide_with: Iterable[str] = RAY_CAST_NAMES,
+    ) -> np.ndarray:
+        """
+        Cast rays from each of the given (n, 2) start positions to the end position
+        in the same row at once, stepping all rays together with NumPy.
+        Returns whether each ray was blocked, exactly as ray_cast() would for the ray.
+        """
+        summed_area, origin = self.get_summed_area(collide_with)
+        height, width = summed_area.shape[0] - 1, summed_area.shape[1] - 1
+        w, h = self.get_ray_size(ray_width, step_dist)
+
+        positions = np.array(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.array(ends, dtype=np.float64).reshape(-1, 2)
+        blocked = np.zeros(len(positions), dtype=bool)
+        # rays that have yet to reach their ends or be blocked
+        active = np.arange(len(positions))
+        while len(active) > 0:
+            # step as the Vector2 arithmetic of ray_cast() does, in the same order
+            disp = ends[active] - positions[active]
+            length = np.sqrt(disp[:, 0] * disp[:, 0] + disp[:, 1] * disp[:, 1])
+            moving = length > 0
+            active, disp, length = active[moving], disp[moving], length[moving]
+            heading = disp / length[:, np.newaxis]
+            positions[active] += heading * np.minimum(step_dist, length)[:, np.newaxis]
+
+            # position rects as pygame.Rect rounds positions: halves away from zero
+            left = round_half_away(positions[active, 0] - w / 2) - origin[0]
+            top = round_half_away(positions[active, 1] - h / 2) - origin[1]
+            x0, x1 = np.clip(left, 0, width), np.clip(left + w, 0, width)
+            y0, y1 = np.clip(top, 0, height), np.clip(top + h, 0, height)
+            occupied = (
+                summed_area[y1, x1]
+                - summed_area[y0, x1]
+                - summed_area[y1, x0]
+                + summed_area[y0, x0]
+            )
+            hit = occupied > 0
+            blocked[active[hit]] = True
+            active = active[~hit]
+        return blocked
+
+
+def count_occupied(
+    summed_area: np.ndarray,
+    origin: Tuple[int, int],
+    left: int,
+    top: int,
+    right: int,
+    bottom: int,
+) -> int:
+    """
+    Count the occupied pixels within the given screen area using the given
+    summed-area table of an occupancy map with its top left corner at origin.
+    """
+    height, width = summed_area.shape[0] - 1, summed_area.shape[1] - 1
+    x0 = min(max(left - origin[0], 0), width)
+    x1 = min(max(right - origin[0], 0), width)
+    y0 = min(max(top - origin[1], 0), height)
+    y1 = min(max(bottom - origin[1], 0), height)
+    return (
+        summed_area.item(y1, x1)
+        - summed_area.item(y0, x1)
+        - summed_area.item(y1, x0)
+        + summed_area.item(y0, x0)
+    )
+
+
+def count_occupied_unclipped(
+    summed_area: np.ndarray,
+    origin: Tuple[int, int],
+    left: int,
+    top: int,
+    right: int,
+    bottom: int,
+) -> int:
+    """
+    count_occupied() for screen areas known to lie within the summed-area table.
+    """
+    x0, y0 = left - origin[0], top - origin[1]
+    x1, y1 = right - origin[0], bottom - origin[1]
+    return (
+        summed_area.item(y1, x1)
+        - summed_area.item(y0, x1)
+        - summed_area.item(y1, x0)
+        + summed_area.item(y0, x0)
+    )
+
+
+def round_half_away(values: np.ndarray) -> np.ndarray:
+    """
+    Round the given values to the nearest integers, rounding halves away from zero.
+    """
+    rounded = np.rint(values)
+    truncated = np.trunc(values)
+    halves = np.abs(values - truncated) == 0.5
+    rounded[halves] = truncated[halves] + np.sign(values[halves])
+    return rounded.astype(np.int64)
+
+
+class LineOfSightCache:
+    """
+    Caches whether entities have line of sight on their targets, as the same checks
+    are repeated several times per frame & again on the next frame.
+
+    Entries are keyed by (observer, target, ray_width, step_dist, collide_with).
+    An entry stays valid until the observer or target moves further than tolerance
+    from where it was when the entry was cached, or the occupancy map is rebuilt
+    as obstacles were added, removed or moved.
+    With the default tolerance of 0, entries are only reused while neither end moves,
+    keeping results identical to casting every ray. Larger tolerances trade accuracy
+    for hits: check the hit & miss counters when tuning.
+    """
+
+    def __init__(self, world, tolerance: float = 0):
+        self.world = world
+        self.tolerance = tolerance
+        # positions of the observer & target, occupancy map generation &
+        # whether there was line of sight by key
+        self.entries: Dict[Tuple, Tuple] = {}
+        # keys of the entries of each entity by id, to drop them when it is removed
+        self.entity_keys: Dict[int, Set[Tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def has_line_of_sight(
+        self,
+        entity,
+        target,
+        step_dist: float = 10,
+        ray_width: float = 26,
+        collide_with: Iterable[str] = RAY_CAST_NAMES,
+    ) -> bool:
+        """
+        Whether the entity has line of sight on the target, cast with
+        World.line_of_sight's ray_cast() on a cache miss.
+        """
+        collide_names = frozenset(collide_with)
+        key = (entity.id, type(target), target.id, ray_width, step_dist, collide_names)
+        position, target_position = entity.position, target.position
+        occupancy = self.world.occupancy
+        occupancy.refresh()
+
+        entry = self.entries.get(key)
+        if (
+            entry is not None
+            and entry[2] == occupancy.generation
+            and hypot(position[0] - entry[0][0], position[1] - entry[0][1])
+            <= self.tolerance
+            and hypot(
+                target_position[0] - entry[1][0], target_position[1] - entry[1][1]
+            )
+            <= self.tolerance
+        ):
+            self.hits += 1
+            return entry[3]
+
+        self.misses += 1
+        in_sight = (
+            self.world.line_of_sight.ray_cast(
+                position, target, step_dist, ray_width, collide_names
+            )
+            is None
+        )
+        self.entries[key] = (
+            (position[0], position[1]),
+            (target_position[0], target_position[1]),
+            occupancy.generation,
+            in_sight,
+        )
+        # graph node targets are indexed too: at worst their entries are dropped early
+        for entity_id in (entity.id, target.id):
+            self.entity_keys.setdefault(entity_id, set()).add(key)
+        return in_sight
+
+    def removed(self, entity):
+        """
+        Drop the entries of an entity removed from the world.
+        """
+        for key in self.entity_keys.pop(entity.id, ()):
+            self.entries.pop(key, None)
+
+
+class VisibilityMatrix:
+    """
+    Whether each node of a graph has line of sight on each other node, precomputed
+    once by casting rays between every pair of nodes as line_of_sight() would from
+    an entity at one node to the other, since obstacles never move.
+
+    Visibility is bit packed with np.packbits(): row i of the matrix packs whether
+    node i sees each node, 8 nodes to a byte, in the order nodes were added to the
+    graph. Rays are not symmetric as they are stepped from their start, so node i
+    seeing node j does not imply the reverse.
+    Only valid for the graph & obstacles it was computed for: get matrices with
+    World.get_visibility_matrix(), which recomputes them when either changes.
+    """
+
+    def __init__(self, world, graph, ray_width: float = 26, step_dist: float = 10):
+        self.graph = graph
+        self.ray_width = ray_width
+        self.nodes = list(graph.nodes.values())
+        self.index = {node.id: i for i, node in enumerate(self.nodes)}
+
+        n_nodes = len(self.nodes)
+        positions = np.array(
+            [node.position for node in self.nodes], dtype=np.float64
+        ).reshape(-1, 2)
+        self.bits = np.zeros((n_nodes, (n_nodes + 7) // 8), dtype=np.uint8)
+        # cast rays from a chunk of rows of nodes at a time, bounding memory use
+        n_rows = max(1, VISIBILITY_CHUNK_SIZE // max(n_nodes, 1))
+        for row in range(0, n_nodes, n_rows):
+            starts = positions[row : row + n_rows]
+            blocked = world.line_of_sight.ray_cast_all(
+                np.repeat(starts, n_nodes, axis=0),
+                np.tile(positions, (len(starts), 1)),
+                step_dist,
+                ray_width,
+            )
+            self.bits[row : row + n_rows] = np.packbits(
+                ~blocked.reshape(len(starts), n_nodes), axis=1
+            )
+
+    def can_see(self, from_node, to_node) -> bool:
+        """
+        Whether an entity at from_node has line of sight on to_node.
+        """
+        j = self.index[to_node.id]
+        byte = self.bits.item(self.index[from_node.id], j >> 3)
+        return bool(byte >> (7 - (j & 7)) & 1)
+
+    def visible_from(self, position) -> List:
+        """
+        Get the nodes seen from the node nearest to the given position, found with
+        the graph's nearest node index, in the order nodes were added to the graph.
+        """
+        node = self.graph.get_nearest_node(position)
+        if node is None:
+            return []
+        visible = np.unpackbits(self.bits[self.index[node.id]], count=len(self.nodes))
+        return [self.nodes[i] for i in np.flatnonzero(visible)]
@@ -0,0 +1,141 @@
+#
+# NP AIG Assignment 1
+# Per frame nearest opponent cache
+#
+
+import numpy as np
+from math import hypot
+from Globals import ENTITY_KINDS, NEUTRAL_TEAM_ID, TRANSIENT_KINDS
+
+
+class NearestOpponents:
+    """
+    Caches the opponents of every entity sorted by distance, computed with one
+    NumPy distance matrix at the first query of each frame.
+
+    Entities keep moving while the frame is processed, so queries do not trust the
+    cached distances: they walk the cached order, measuring current distances, until
+    the cached distance less the furthest any entity has moved since the matrix was
+    built exceeds the nearest current distance found. Entities added or moved further
+    than teleport_dist since the matrix was built are measured directly.
+    This keeps results identical to scanning every opponent.
+    """
+
+    def __init__(self, world, teleport_dist: float = 32):
+        self.world = world
+        self.teleport_dist = teleport_dist
+        # frame the matrix was built for, None if it has to be rebuilt
+        self.frame = None
+
+    def build(self):
+        """
+        Compute the distance matrix & sorted opponents for the current frame.
+        """
+        world = self.world
+        self.entities = world.get_partition_entities(
+            [p for p in world.get_partitions() if p[1] not in TRANSIENT_KINDS]
+        )
+        self.index = {entity.id: i for i, entity in enumerate(self.entities)}
+        self.positions = [(e.position[0], e.position[1]) for e in self.entities]
+
+        positions = np.array(self.positions, dtype=np.float64).reshape(-1, 2)
+        teams = np.array([e.team_id for e in self.entities])
+        disp = positions[:, np.newaxis, :] - positions[np.newaxis, :, :]
+        distances = np.sqrt(
+            disp[:, :, 0] * disp[:, :, 0] + disp[:, :, 1] * disp[:, :, 1]
+        )
+        # opponents are on another team & not neutral
+        is_opponent = (teams[:, np.newaxis] != teams[np.newaxis, :]) & (
+            teams[np.newaxis, :] != NEUTRAL_TEAM_ID
+        )
+        distances[~is_opponent] = np.inf
+        self.distances = distances
+        # stable sort breaks ties by id, as entities are in id order
+        self.order = np.argsort(distances, axis=1, kind="stable")
+        self.n_opponents = is_opponent.sum(axis=1)
+        # opponents of each entity sorted by distance, converted when first queried
+        self.rows = {}
+
+        # entities added or teleported since the matrix was built, by id
+        self.unsorted = {}
+        # furthest any other entity has moved since the matrix was built
+        self.max_moved = 0.0
+        self.frame = world.frame
+
+    def added(self, entity):
+        """
+        Track an entity added to the world after the matrix was built.
+        """
+        if self.frame is not None and entity.id not in self.index:
+            self.unsorted[entity.id] = entity
+
+    def moved(self, entity):
+        """
+        Track how far an entity has moved since the matrix was built.
+        """
+        if self.frame is None or entity.id not in self.index:
+            return
+        x, y = self.positions[self.index[entity.id]]
+        moved = hypot(entity.position[0] - x, entity.position[1] - y)
+        if moved > self.teleport_dist:
+            self.unsorted[entity.id] = entity
+        elif moved > self.max_moved:
+            self.max_moved = moved
+
+    def nearest(self, char):
+        """
+        Return the nearest opponent of the given entity that is not ko'd, or None.
+        """
+        world = self.world
+        if self.frame != world.frame:
+            self.build()
+        if char.id not in self.index:
+            # not in the matrix: fall back on the spatial hash
+            return world.spatial_hash.nearest(
+                char.position,
+                lambda entity: not entity.ko,
+                world.get_opponent_partitions(char.team_id),
+            )
+
+        i = self.index[char.id]
+        if i not in self.rows:
+            row = self.order[i, : self.n_opponents[i]]
+            self.rows[i] = (row.tolist(), self.distances[i, row].tolist())
+        row, row_distances = self.rows[i]
+
+        # distances may have changed by how far char & its opponents have moved
+        x, y = self.positions[i]
+        slack = (
+            hypot(char.position[0] - x, char.position[1] - y) + self.max_moved + 1e-6
+        )
+
+        nearest, nearest_dist = None, None
+
+        def consider(entity):
+            nonlocal nearest, nearest_dist
+            if entity.ko or world.entities.get(entity.id) is not entity:
+                return
+            dist = (char.position - entity.position).length()
+            if (
+                nearest is None
+                or dist < nearest_dist
+                or (dist == nearest_dist and entity.id < nearest.id)
+            ):
+                nearest, nearest_dist = entity, dist
+
+        for j, cached_dist in zip(row, row_distances):
+            if nearest is not None and cached_dist - slack > nearest_dist:
+                break
+            entity = self.entities[j]
+            if entity.id not in self.unsorted:
+                consider(entity)
+
+        opponent_teams = world.get_opponent_teams(char.team_id)
+        for entity in self.unsorted.values():
+            if (
+                entity.team_id in opponent_teams
+                and ENTITY_KINDS.get(entity.name, "other") not in TRANSIENT_KINDS
+            ):
+                consider(entity)
+
+        return nearest
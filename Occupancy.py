@@ -0,0 +1,152 @@
+#
+# NP AIG Assignment 1
+# Occupancy map of the world's static obstacles
+#
+
+import numpy as np
+import pygame
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+# names of the entities that block other entities from moving into them
+BLOCKING_NAMES = ("obstacle", "base")
+# alpha above which pygame.mask.from_surface() sets the pixels of a mask
+MASK_THRESHOLD = 127
+
+
+def image_array(image: pygame.Surface) -> np.ndarray:
+    """
+    Get the pixels pygame.mask.from_surface() would set for the given image
+    as a boolean array indexed by (y, x).
+    """
+    if image.get_colorkey() is not None:
+        return pygame.surfarray.array_colorkey(image).T > 0
+    return pygame.surfarray.array_alpha(image).T > MASK_THRESHOLD
+
+
+class Occupancy:
+    """
+    Occupancy map of the world's static obstacles, rasterized from their masks into
+    packed bitmaps (pygame masks) over the area covered by the obstacles.
+    There is one bitmap per team, occupied by the obstacles not on that team.
+
+    The bitmaps are rebuilt whenever the obstacles' rects change (see moved()), which
+    only happens as obstacles are first processed, so they always reflect the rects
+    that mask collisions against the obstacles would use.
+    Bitmaps & arrays returned are shared read only assets: they must not be modified.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        # obstacles & their rects the bitmaps were built for
+        self.signature = None
+        self.n_obstacles = None
+        # whether an obstacle's rect may have changed since the bitmaps were built
+        self.stale = True
+        # no. of times the bitmaps were rebuilt, for caches of results derived from them
+        self.generation = 0
+
+    def moved(self, entity):
+        """
+        Track that the rect of the given entity has changed.
+        """
+        if entity.name in BLOCKING_NAMES:
+            self.stale = True
+
+    def refresh(self):
+        """
+        Rebuild the occupancy map if the world's obstacles or their rects changed.
+        """
+        if not self.stale and len(self.world.obstacles) == self.n_obstacles:
+            return
+        self.stale, self.n_obstacles = False, len(self.world.obstacles)
+        obstacles = [o for o in self.world.obstacles if o.name in BLOCKING_NAMES]
+        signature = tuple((o.id, o.team_id, tuple(o.rect)) for o in obstacles)
+        if signature == self.signature:
+            return
+
+        self.signature = signature
+        self.obstacles = obstacles
+        self.generation += 1
+        self.bounds = (
+            obstacles[0].rect.unionall([o.rect for o in obstacles[1:]])
+            if obstacles
+            else pygame.Rect(0, 0, 0, 0)
+        )
+        # bitmaps & arrays by the team whose obstacles are left out, or None,
+        # & the names of the obstacles occupying them
+        self.masks: Dict[Tuple[Optional[int], FrozenSet[str]], pygame.mask.Mask] = {}
+        self.arrays: Dict[Tuple[Optional[int], FrozenSet[str]], np.ndarray] = {}
+
+    def get_mask(
+        self, team_id: Optional[int] = None, names: Iterable[str] = BLOCKING_NAMES
+    ) -> Tuple[pygame.mask.Mask, Tuple[int, int]]:
+        """
+        Get the bitmap occupied by the obstacles with the given names that are not
+        on the given team, or by every such obstacle if team_id is None, with the
+        screen position of its top left corner.
+        """
+        self.refresh()
+        key = (team_id, frozenset(names))
+        if key not in self.masks:
+            mask = pygame.mask.Mask(self.bounds.size)
+            for obstacle in self.obstacles:
+                if obstacle.team_id != team_id and obstacle.name in key[1]:
+                    mask.draw(
+                        obstacle.mask,
+                        (
+                            obstacle.rect.x - self.bounds.x,
+                            obstacle.rect.y - self.bounds.y,
+                        ),
+                    )
+            self.masks[key] = mask
+        return self.masks[key], self.bounds.topleft
+
+    def get_array(
+        self, team_id: Optional[int] = None, names: Iterable[str] = BLOCKING_NAMES
+    ) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Get the bitmap from get_mask() as a boolean array indexed by (y, x),
+        with the screen position of its top left corner.
+        """
+        self.refresh()
+        key = (team_id, frozenset(names))
+        if key not in self.arrays:
+            # rasterized from the obstacles' images the way their masks were,
+            # as pygame 1.9 masks cannot be read out in bulk
+            array = np.zeros((self.bounds.height, self.bounds.width), dtype=bool)
+            for obstacle in self.obstacles:
+                if obstacle.team_id != team_id and obstacle.name in key[1]:
+                    x = obstacle.rect.x - self.bounds.x
+                    y = obstacle.rect.y - self.bounds.y
+                    width, height = obstacle.rect.size
+                    array[y : y + height, x : x + width] |= image_array(obstacle.image)
+            array.flags.writeable = False
+            self.arrays[key] = array
+        return self.arrays[key], self.bounds.topleft
+
+    def overlaps(self, entity, team_id: Optional[int] = None) -> bool:
+        """
+        Whether the mask of the given entity overlaps any obstacle not on the given
+        team, or any obstacle if team_id is None. Only tests the entity's footprint.
+        """
+        mask, (x, y) = self.get_mask(team_id)
+        return (
+            mask.overlap(entity.mask, (entity.rect.x - x, entity.rect.y - y))
+            is not None
+        )
+
+    def count_overlapping(self, entity) -> int:
+        """
+        Count the obstacles not on the entity's team that overlap the entity's mask.
+        """
+        if not self.overlaps(entity, entity.team_id):
+            return 0
+        # rarely overlapping: count the overlapping obstacles individually
+        return len(
+            pygame.sprite.spritecollide(
+                entity,
+                [o for o in self.obstacles if o.team_id != entity.team_id],
+                False,
+                pygame.sprite.collide_mask,
+            )
+        )
@@ -44,7 +44,7 @@ class OrcStateSeeking(State):
 
         nearest_node = self.path_graph.get_nearest_node(self.orc.position)
 
-        self.path = pathFindAStar(
+        self.path = pathFindFlowField(
             self.path_graph,
             nearest_node,
             self.path_graph.nodes[self.orc.base.target_node_index],
@@ -86,7 +86,7 @@ class OrcStateSeeking(State):
 
         nearest_node = self.path_graph.get_nearest_node(self.orc.position)
 
-        self.path = pathFindAStar(
+        self.path = pathFindFlowField(
             self.path_graph,
             nearest_node,
             self.path_graph.nodes[self.orc.base.target_node_index],
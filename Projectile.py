@@ -1,6 +1,7 @@
 import pygame
 
 from GameEntity import *
+from render_resources import precompute_rotations
 
 # --- A fireball explosion that hits all opponents ---
 class Explosion(GameEntity):
@@ -26,8 +27,20 @@ class Explosion(GameEntity):
 
         # --- self.exploded is set to True after the first call, so this happens only once ---
         if not self.exploded:
+            # explosions never hit their own team, projectiles or obstacles
+            # only entities overlapping the explosion's rect can overlap its mask
+            candidates = self.world.rect_grid.query(
+                self.rect,
+                [
+                    (team_id, kind)
+                    for team_id, kind in self.world.get_partitions()
+                    if team_id != self.team_id
+                    and kind != "projectiles"
+                    and kind != "obstacles"
+                ],
+            )
             collide_list = pygame.sprite.spritecollide(
-                self, self.world.entities.values(), False, pygame.sprite.collide_mask
+                self, candidates, False, pygame.sprite.collide_mask
             )
             for entity in collide_list:
                 if entity.team_id == self.team_id:
@@ -51,6 +64,8 @@ class Projectile(GameEntity):
     def __init__(self, owner, world, image, explosive_image=None):
 
         GameEntity.__init__(self, world, "projectile", image, False)
+        # projectiles are rotated to their heading every frame
+        precompute_rotations(image)
 
         self.owner = owner
         self.max_range = 100
@@ -76,9 +91,19 @@ class Projectile(GameEntity):
 
             # deal damage to opponent if it collides
             else:
+                # projectiles never hit their own team or other projectiles
+                # only entities overlapping the projectile's rect can overlap its mask
+                candidates = self.world.rect_grid.query(
+                    self.rect,
+                    [
+                        (team_id, kind)
+                        for team_id, kind in self.world.get_partitions()
+                        if team_id != self.team_id and kind != "projectiles"
+                    ],
+                )
                 collide_list = pygame.sprite.spritecollide(
                     self,
-                    self.world.entities.values(),
+                    candidates,
                     False,
                     pygame.sprite.collide_mask,
                 )
@@ -106,7 +131,9 @@ class Projectile(GameEntity):
             if not exploded:
                 collide_list = pygame.sprite.spritecollide(
                     self,
-                    self.world.entities.values(),
+                    self.world.rect_grid.query(
+                        self.rect, self.world.get_partitions(kinds=["obstacles"])
+                    ),
                     False,
                     pygame.sprite.collide_mask,
                 )
@@ -0,0 +1,291 @@
+#
+# NP AIG Assignment 1
+# Spatial hashes of game entities for radius, nearest & rect overlap queries
+#
+
+from math import floor
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from pygame import Rect, Vector2
+
+
+class SpatialHash:
+    """
+    Uniform grid of game entities bucketed by position, split into partitions
+    (eg. by team & kind) so that queries only visit the partitions they need.
+    Entities are kept up to date by GameEntity's position setter, so queries always
+    reflect the current positions of entities, even midway through a frame.
+    Queries return entities in id order, matching iteration over world.entities.
+    """
+
+    def __init__(self, cell_size: float = 64):
+        self.cell_size = cell_size
+        # entities by id, bucketed by grid cell, by partition
+        self.partitions: Dict[Hashable, Dict[Tuple[int, int], Dict[int, object]]] = {}
+        # bounds of the cells ever occupied, as (min x, min y, max x, max y)
+        self.bounds = None
+
+    def cell_of(self, position: Vector2) -> Tuple[int, int]:
+        """
+        Return the grid cell containing the given position.
+        """
+        return (
+            floor(position[0] / self.cell_size),
+            floor(position[1] / self.cell_size),
+        )
+
+    def insert(self, entity, partition: Hashable = None):
+        """
+        Insert the given entity into the given partition of the spatial hash.
+        """
+        x, y = self.cell_of(entity.position)
+        entity.spatial_cell = (partition, (x, y))
+        cells = self.partitions.setdefault(partition, {})
+        cells.setdefault((x, y), {})[entity.id] = entity
+        if self.bounds is None:
+            self.bounds = (x, y, x, y)
+        elif not (
+            self.bounds[0] <= x <= self.bounds[2]
+            and self.bounds[1] <= y <= self.bounds[3]
+        ):
+            self.bounds = (
+                min(self.bounds[0], x),
+                min(self.bounds[1], y),
+                max(self.bounds[2], x),
+                max(self.bounds[3], y),
+            )
+
+    def remove(self, entity):
+        """
+        Remove the given entity from the spatial hash.
+        """
+        partition, cell = entity.spatial_cell
+        entities = self.partitions[partition][cell]
+        del entities[entity.id]
+        if not entities:
+            del self.partitions[partition][cell]
+        entity.spatial_cell = None
+
+    def move(self, entity):
+        """
+        Rebucket the given entity after its position has changed.
+        """
+        partition, cell = entity.spatial_cell
+        if self.cell_of(entity.position) != cell:
+            self.remove(entity)
+            self.insert(entity, partition)
+
+    def select(self, partitions: Optional[Iterable[Hashable]]) -> List[Dict]:
+        """
+        Return the cells of the given partitions, or of every partition if None.
+        """
+        if partitions is None:
+            return list(self.partitions.values())
+        return [self.partitions[p] for p in partitions if p in self.partitions]
+
+    def query(
+        self,
+        position: Vector2,
+        radius: float,
+        predicate: Optional[Callable[[object], bool]] = None,
+        partitions: Optional[Iterable[Hashable]] = None,
+    ) -> List:
+        """
+        Return the entities within radius of the given position, in id order.
+        If given, only entities in partitions that satisfy predicate are returned.
+        """
+        (min_x, min_y), (max_x, max_y) = (
+            self.cell_of((position[0] - radius, position[1] - radius)),
+            self.cell_of((position[0] + radius, position[1] + radius)),
+        )
+        n_covered = (max_x - min_x + 1) * (max_y - min_y + 1)
+
+        found = []
+        for cells in self.select(partitions):
+            # scan whichever is smaller: the cells covered by the radius or the occupied cells
+            if n_covered <= len(cells):
+                entity_cells = (
+                    cells.get((x, y))
+                    for x in range(min_x, max_x + 1)
+                    for y in range(min_y, max_y + 1)
+                )
+            else:
+                entity_cells = (
+                    entities
+                    for (x, y), entities in cells.items()
+                    if min_x <= x <= max_x and min_y <= y <= max_y
+                )
+
+            found.extend(
+                entity
+                for entities in entity_cells
+                if entities
+                for entity in entities.values()
+                if (entity.position - position).length() <= radius
+                and (predicate is None or predicate(entity))
+            )
+        found.sort(key=lambda entity: entity.id)
+        return found
+
+    def nearest_k(
+        self,
+        position: Vector2,
+        k: int,
+        predicate: Optional[Callable[[object], bool]] = None,
+        partitions: Optional[Iterable[Hashable]] = None,
+    ) -> List:
+        """
+        Return up to k entities nearest to the given position, nearest first.
+        Entities at the same distance are ordered by id.
+        If given, only entities in partitions that satisfy predicate are considered.
+        """
+        selected = [cells for cells in self.select(partitions) if cells]
+        if k <= 0 or not selected:
+            return []
+        center_x, center_y = self.cell_of(position)
+        # furthest ring of cells that may hold entities
+        min_x, min_y, max_x, max_y = self.bounds
+        max_ring = max(
+            center_x - min_x, center_y - min_y, max_x - center_x, max_y - center_y
+        )
+
+        found = []
+        for ring in range(max_ring + 1):
+            # once k entities are found, stop when the ring can only hold further entities
+            if len(found) >= k and (ring - 1) * self.cell_size > found[k - 1][0]:
+                break
+
+            for cell in ring_cells(center_x, center_y, ring):
+                for cells in selected:
+                    entities = cells.get(cell)
+                    if not entities:
+                        continue
+                    for entity in entities.values():
+                        if predicate is None or predicate(entity):
+                            found.append(
+                                (
+                                    (position - entity.position).length(),
+                                    entity.id,
+                                    entity,
+                                )
+                            )
+            found.sort(key=lambda item: item[:2])
+
+        return [entity for _, _, entity in found[:k]]
+
+    def nearest(
+        self,
+        position: Vector2,
+        predicate: Optional[Callable[[object], bool]] = None,
+        partitions: Optional[Iterable[Hashable]] = None,
+    ):
+        """
+        Return the entity nearest to the given position or None if there is none.
+        Ties are broken by id.
+        If given, only entities in partitions that satisfy predicate are considered.
+        """
+        nearest = self.nearest_k(position, 1, predicate, partitions)
+        return nearest[0] if nearest else None
+
+
+def ring_cells(center_x: int, center_y: int, ring: int) -> Iterable[Tuple[int, int]]:
+    """
+    Yield the grid cells on the square ring at the given distance from the center cell.
+    """
+    if ring == 0:
+        yield center_x, center_y
+        return
+    for x in range(center_x - ring, center_x + ring + 1):
+        yield x, center_y - ring
+        yield x, center_y + ring
+    for y in range(center_y - ring + 1, center_y + ring):
+        yield center_x - ring, y
+        yield center_x + ring, y
+
+
+class RectGrid:
+    """
+    Uniform grid of game entities bucketed by every cell their rect overlaps, split
+    into partitions like SpatialHash, as a broad phase for rect & mask collisions.
+    Entities are kept up to date by GameEntity.sync_rect(), so queries always reflect
+    the current rects of entities, even midway through a frame.
+    Queries return entities in id order, matching iteration over world.entities.
+    """
+
+    def __init__(self, cell_size: float = 64):
+        self.cell_size = cell_size
+        # entities by id, bucketed by grid cell, by partition
+        self.partitions: Dict[Hashable, Dict[Tuple[int, int], Dict[int, object]]] = {}
+
+    def cells_of(self, rect: Rect) -> Tuple[int, int, int, int]:
+        """
+        Return the range of grid cells overlapped by the given rect,
+        as (min x, min y, max x, max y).
+        """
+        return (
+            floor(rect.left / self.cell_size),
+            floor(rect.top / self.cell_size),
+            # rects do not overlap the cells their right & bottom edges touch
+            floor((rect.right - 1) / self.cell_size),
+            floor((rect.bottom - 1) / self.cell_size),
+        )
+
+    def insert(self, entity, partition: Hashable = None):
+        """
+        Insert the given entity into the given partition of the grid by its rect.
+        """
+        cell_range = self.cells_of(entity.rect)
+        entity.rect_cells = (partition, cell_range)
+        cells = self.partitions.setdefault(partition, {})
+        min_x, min_y, max_x, max_y = cell_range
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                cells.setdefault((x, y), {})[entity.id] = entity
+
+    def remove(self, entity):
+        """
+        Remove the given entity from the grid.
+        """
+        partition, (min_x, min_y, max_x, max_y) = entity.rect_cells
+        cells = self.partitions[partition]
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                entities = cells[(x, y)]
+                del entities[entity.id]
+                if not entities:
+                    del cells[(x, y)]
+        entity.rect_cells = None
+
+    def move(self, entity):
+        """
+        Rebucket the given entity after its rect has changed.
+        """
+        partition, cell_range = entity.rect_cells
+        if self.cells_of(entity.rect) != cell_range:
+            self.remove(entity)
+            self.insert(entity, partition)
+
+    def query(
+        self, rect: Rect, partitions: Optional[Iterable[Hashable]] = None
+    ) -> List:
+        """
+        Return the entities whose rects overlap the given rect, in id order.
+        If given, only entities in partitions are returned.
+        """
+        min_x, min_y, max_x, max_y = self.cells_of(rect)
+        if partitions is None:
+            selected = list(self.partitions.values())
+        else:
+            selected = [self.partitions[p] for p in partitions if p in self.partitions]
+
+        found = {}
+        for cells in selected:
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    entities = cells.get((x, y))
+                    if entities:
+                        found.update(entities)
+        return [
+            found[entity_id]
+            for entity_id in sorted(found)
+            if found[entity_id].rect.colliderect(rect)
+        ]
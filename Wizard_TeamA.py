@@ -129,7 +129,7 @@ class WizardStateSeeking_TeamA(State):
 
         nearest_node = self.wizard.path_graph.get_nearest_node(self.wizard.position)
 
-        self.path = pathFindAStar(
+        self.path = pathFindFlowField(
             self.wizard.path_graph,
             nearest_node,
             self.wizard.path_graph.nodes[self.wizard.base.target_node_index],
@@ -5,12 +5,13 @@ import math
 import random
 from os import close
 from pygame import Vector2, sprite, Surface
-from Globals import SCREEN_HEIGHT, SCREEN_WIDTH
+from Globals import SCREEN_HEIGHT, SCREEN_WIDTH, ENTITY_KINDS
 from typing import Dict, List, Tuple, Callable, Union, Iterable, Optional
 from enum import Enum
 
 from HAL import Obstacle
 from GameEntity import GameEntity
+from map_bundle import load_path as load_map_path
 from Graph import Connection, Node, Graph, pathFindAStar
 
 
@@ -41,12 +42,8 @@ def _load_path():
         if filename in cache:
             return cache[filename]
 
-        path = []
-        with open(filename, "r") as f:
-            for line in f:
-                # Read and create a vector from the line
-                vec = Vector2(*map(int, line.strip().split(",")))
-                path.append(vec)
+        # create a vector from each point of the path
+        path = [Vector2(*point) for point in load_map_path(filename).tolist()]
         cache[filename] = path
         return path
 
@@ -476,11 +473,14 @@ def collect_threats(
     Collect all immediate and non immediate threats within terror radius
     Returns a list of immediate and non immediate threats
     """
-    hostile_entities = [
-        e
-        for e in entity.world.entities.values()
-        if is_in_radius(e, entity, terror_radius) and is_hostile(e, entity)
-    ]
+    # entities on the same team are never hostile
+    world = entity.world
+    hostile_entities = world.spatial_hash.query(
+        entity.position,
+        terror_radius,
+        lambda e: is_in_radius(e, entity, terror_radius) and is_hostile(e, entity),
+        [p for p in world.get_partitions() if p[0] != entity.team_id],
+    )
 
     immediate_threats = []
     non_immediate_threats = []
@@ -502,9 +502,18 @@ def detect_collisions(entity: GameEntity, collide_with: Iterable[str], any_one=F
     Returns a list of pairs of obstacle object and the collision points.
     """
     collide_names = frozenset(collide_with)
+    # the occupancy map rules out obstacle collisions without testing each obstacle
+    if collide_names == {"obstacle"} and not entity.world.occupancy.overlaps(entity):
+        return []
     # filter to entities to collide with specified by collide_with
+    # only entities overlapping the entity's rect can overlap its mask
+    collide_kinds = {ENTITY_KINDS.get(name, "other") for name in collide_names}
     collide_entities = [
-        e for e in entity.world.entities.values() if e.name in collide_names
+        e
+        for e in entity.world.rect_grid.query(
+            entity.rect, entity.world.get_partitions(kinds=collide_kinds)
+        )
+        if e.name in collide_names
     ]
 
     collisions = []
@@ -536,8 +545,21 @@ def line_of_sight(
     By shooting a virtual "ray of light" toward the target and checking for collisions
     along the way with entities of collide_with names at after traveling for each step_dist.
     """
-    # shoot a virtual "ray" towards the target
+    # cast the ray over the world's occupancy map if only colliding with obstacles
     world = entity.world
+    if world.line_of_sight.can_ray_cast(target, collide_with):
+        if world.line_of_sight_cache is not None:
+            return world.line_of_sight_cache.has_line_of_sight(
+                entity, target, step_dist, ray_width, collide_with
+            )
+        return (
+            world.line_of_sight.ray_cast(
+                entity.position, target, step_dist, ray_width, collide_with
+            )
+            is None
+        )
+
+    # shoot a virtual "ray" towards the target
     ray = GameEntity(entity.world, "ray", Surface((ray_width, step_dist)))
     # ray of light's collision mask should be filled.
     ray.mask.fill()
@@ -548,15 +570,16 @@ def line_of_sight(
         disp = target.position - ray.position
         heading = disp.normalize()
         ray.position = ray.position + heading * min(step_dist, disp.length())
-        # call process() manually is not actually added to the game world
-        ray.process(time_passed=0)
+        # sync the ray's rect manually as it is not actually added to the game world
+        ray.sync_rect(ray.position)
 
         # check for collisions along the way
         collisions = detect_collisions(ray, collide_with, any_one=True)
         if len(collisions) > 0:
             collided, collide_pt = collisions[0]
-            # check that we are not colliding with our target
-            if collided.id != target.id:
+            # check that we are not colliding with our target:
+            # graph nodes are never collided with, even if they share an entity's id
+            if isinstance(target, Node) or collided.id != target.id:
                 # no line of sight: ray collided
                 return False
     return True
@@ -620,44 +643,9 @@ def is_target_ko(entity: GameEntity) -> bool:
 def interpolate_graph(graph: Graph, interval_dist: float = 20) -> Graph:
     """
     Linearly Interpolate the connections in the given graph, inserting nodes every interval_dist.
+    Builds a new graph on every call: use World.get_interpolated_graph() to share one instead.
     """
-    interp_graph = Graph(graph.world)
-    interp_graph.nodes = dict(graph.nodes)
-    new_node_id = max([node_id for node_id in graph.nodes]) + 1
-
-    for connection in graph.connections:
-        # calculate no. of intervals to next node
-        start_node, end_node = connection.fromNode, connection.toNode
-        start_pos, end_pos = Vector2(start_node.position), Vector2(end_node.position)
-        node_dist = distance(start_pos, end_pos)
-        n_intervals = int(node_dist // interval_dist)
-
-        # add interval points between prev and next nnodes
-        prev_node = start_node
-        # interpolation exclusive of both start and end pos
-        for i_interval in range(1, n_intervals):
-            interp_pos = start_pos.lerp(end_pos, i_interval / n_intervals)
-
-            # create interpolated node
-            interp_node = Node(
-                interp_graph, new_node_id, int(interp_pos[0]), int(interp_pos[1])
-            )
-            new_node_id += 1
-            interp_graph.nodes[new_node_id] = interp_node
-
-            # create connection to interpolated node
-            interp_graph.addConnection(
-                prev_node,
-                interp_node,
-                distance(prev_node.position, interp_node.position),
-            )
-            prev_node = interp_node
-        # create connection to end node
-        interp_graph.addConnection(
-            prev_node, end_node, distance(prev_node.position, interp_node.position)
-        )
-
-    return interp_graph
+    return graph.interpolate(interval_dist)
 
 
 def route_dist(
@@ -675,12 +663,15 @@ def route_dist(
         v2 = Vector2(v2)
 
     v1_node, v2_node = graph.get_nearest_node(v1), graph.get_nearest_node(v2)
-    path = pathFindAStar(
-        graph,
-        v1_node,
-        v2_node,
-    )
-    path_dist = sum([c.cost for c in path])
+    # use the precomputed route cost if the graph has one
+    path_dist = graph.routeCost(v1_node, v2_node)
+    if path_dist is None:
+        path = pathFindAStar(
+            graph,
+            v1_node,
+            v2_node,
+        )
+        path_dist = sum([c.cost for c in path])
     return distance(v1, v1_node.position) + path_dist + distance(v2_node.position, v2)
 
 
@@ -698,18 +689,16 @@ def find_closest_opponents(
         terror_radius = entity.min_target_distance
     # filter game entities into opponents
     world = entity.world
-    opponents = [
-        e
-        for e in world.entities.values()
-        if (
-            e.team_id != 2
-            and e.team_id != entity.team_id
-            and not (e.name == "projectile" or e.name == "explosion")
-            and not e.ko
+    opponents = world.spatial_hash.query(
+        entity.position,
+        terror_radius,
+        lambda e: (
+            not e.ko
             and distance(entity.position, e.position) <= terror_radius
             and line_of_sight(entity, e)
-        )
-    ]
+        ),
+        world.get_opponent_partitions(entity.team_id),
+    )
 
     opponents.sort(key=lambda e: distance(entity.position, e.position))
     return opponents
@@ -22,6 +22,14 @@ class Camera:
     def __init__(self, path):
         self.path = path
 
+    @property
+    def needs_frames(self):
+        """
+        Whether the camera records the frames passed to record().
+        If False, callers may skip capturing frames for the camera.
+        """
+        return True
+
     @abstractmethod
     def record(self, frame_str, step=0):
         """
@@ -40,6 +48,10 @@ class Camera:
 class NOPCamera(Camera):
     """Defines a do nothing camera."""
 
+    @property
+    def needs_frames(self):
+        return False
+
     def record(self, frame_str, step=0):
         pass
 
@@ -0,0 +1,115 @@
+#
+# NP AIG Assignment 1
+# Dirty rectangle renderer of the game world
+#
+
+import pygame
+from typing import Dict, List, Tuple
+from Globals import DEBUG, SHOW_PATHS
+
+
+class DirtyRenderer:
+    """
+    Renders the world by only redrawing the areas of the screen that changed since
+    the last frame it rendered, instead of the whole screen.
+
+    When the render state of an entity or label changes, the areas it was drawn in
+    & is drawn in are dirty. Each dirty area is redrawn from the background up with
+    everything overlapping it, such as an obstacle walked over, clipped to the area.
+    The screen always ends up the same as if it was rendered in full by World.render().
+    Falls back to rendering in full when DEBUG or SHOW_PATHS draw extra lines.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        # render state & drawn area of each entity & label by key, None before rendering
+        self.previous: Dict = None
+
+    def layers(self) -> List[Tuple]:
+        """
+        Return what is drawn over the background, in drawing order, as
+        (key, render state, drawn area or None, draw function) tuples.
+        """
+        layers = [
+            (
+                entity.id,
+                entity.get_render_state(),
+                entity.get_render_rect(),
+                entity.render,
+            )
+            for entity in self.world.entities.values()
+        ]
+        for i, (label, position) in enumerate(self.world.get_hud_labels()):
+            layers.append(
+                (
+                    ("label", i),
+                    (label, position),
+                    pygame.Rect(position, label.get_size()),
+                    lambda surface, label=label, position=position: surface.blit(
+                        label, position
+                    ),
+                )
+            )
+        return layers
+
+    def render(self, surface: pygame.Surface) -> List[pygame.Rect]:
+        """
+        Render the world onto the given surface, returning the areas of the surface
+        that were redrawn, to be passed to pygame.display.update().
+        """
+        layers = self.layers()
+        current = {key: (state, rect) for key, state, rect, _ in layers}
+
+        if self.previous is None or DEBUG or SHOW_PATHS:
+            self.world.render(surface)
+            # render states are read before drawing: rendering may change them
+            self.previous = current
+            return [surface.get_rect()]
+
+        # areas previously drawn by anything that changed or is gone
+        dirty = [
+            previous_rect
+            for key, (previous_state, previous_rect) in self.previous.items()
+            if previous_rect is not None
+            and (key not in current or current[key][0] != previous_state)
+        ]
+        # areas to draw anything that changed or is new
+        dirty.extend(
+            rect
+            for key, state, rect, _ in layers
+            if rect is not None
+            and (key not in self.previous or self.previous[key][0] != state)
+        )
+
+        # redraw each dirty area from the background up, drawing only within the area
+        # anything overlapping it. areas must not overlap, or sprites overlapping
+        # several areas would be blended twice where they overlap.
+        bounds = surface.get_rect()
+        dirty = [rect.clip(bounds) for rect in merge_rects(dirty)]
+        dirty = [rect for rect in dirty if rect.width > 0 and rect.height > 0]
+        for rect in dirty:
+            surface.set_clip(rect)
+            surface.blit(self.world.background, rect, rect)
+            for _, _, layer_rect, draw in layers:
+                if layer_rect is not None and layer_rect.colliderect(rect):
+                    draw(surface)
+        surface.set_clip(None)
+
+        self.previous = current
+        return dirty
+
+
+def merge_rects(rects: List[pygame.Rect]) -> List[pygame.Rect]:
+    """
+    Merge the given rects into rects that do not overlap, by replacing overlapping
+    rects with their bounding rect. Every given rect is contained by a merged rect.
+    """
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        overlap = rect.collidelist(merged)
+        while overlap != -1:
+            rect.union_ip(merged.pop(overlap))
+            overlap = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
@@ -0,0 +1,183 @@
+#
+# NP AIG Assignment 1
+# Compiled binary bundle of the map's text files
+#
+
+import os
+import struct
+import zipfile
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from Globals import MAP_BUNDLE_PATH
+
+# bumped whenever the layout of the bundle changes, invalidating older bundles
+MAP_BUNDLE_VERSION = 2
+# pathfinding graph & obstacle path text files compiled into the bundle
+MAP_GRAPH_SRCS = ["pathfinding_graph.txt"]
+MAP_PATH_SRCS = ["mountain_1_path.txt", "mountain_2_path.txt", "plateau_path.txt"]
+
+
+def parse_graph(filename: str) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Parse the given pathfinding graph text file into arrays of:
+    - nodes as rows of (node id, x, y)
+    - connections as rows of (node id, node id)
+    - orc paths each as an array of node ids
+    """
+    with open(filename, "r") as f:
+        sections = f.read().split("connections\n")
+    nodes_text, (connections_text, paths_text) = (
+        sections[0],
+        sections[1].split("paths\n"),
+    )
+
+    def parse_rows(text, n_cols):
+        return np.array(
+            [line.split() for line in text.splitlines() if line.strip()], dtype=np.int64
+        ).reshape(-1, n_cols)
+
+    paths = [
+        np.array(line.split(), dtype=np.int64)
+        for line in paths_text.splitlines()
+        if line.strip()
+    ]
+    return parse_rows(nodes_text, 3), parse_rows(connections_text, 2), paths
+
+
+def parse_path(filename: str) -> np.ndarray:
+    """
+    Parse the given obstacle path text file into an array of (x, y) points.
+    """
+    with open(filename, "r") as f:
+        points = [line.strip().split(",") for line in f if line.strip()]
+    return np.array(points, dtype=np.int64).reshape(-1, 2)
+
+
+def source_stamps(filenames: List[str]) -> np.ndarray:
+    """
+    Stamp the given source files with their sizes & modification times,
+    returned as an (n, 2) array. Stamps only stat the files, without reading them.
+    """
+    stats = [os.stat(filename) for filename in filenames]
+    return np.array(
+        [(stat.st_size, stat.st_mtime_ns) for stat in stats], dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    Memory-map the arrays stored uncompressed in the npz file at path, read only,
+    instead of reading them into memory as np.load() does for npz files.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Cannot memory-map compressed array: {info.filename}")
+            # the array's .npy data follows the member's local file header, which
+            # has its own name & extra field lengths at bytes 26-30
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack("<HH", f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            read_header = (
+                np.lib.format.read_array_header_1_0
+                if version == (1, 0)
+                else np.lib.format.read_array_header_2_0
+            )
+            shape, fortran_order, dtype = read_header(f)
+            arrays[info.filename[: -len(".npy")]] = np.ndarray(
+                shape,
+                dtype,
+                buffer,
+                offset=f.tell(),
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+def compile_map_bundle(bundle_path: str = MAP_BUNDLE_PATH):
+    """
+    Compile the map's text files into a binary bundle written to bundle_path.
+    """
+    arrays = {}
+    for filename in MAP_GRAPH_SRCS:
+        nodes, connections, paths = parse_graph(filename)
+        arrays[f"{filename}.nodes"] = nodes
+        arrays[f"{filename}.connections"] = connections
+        # orc paths are concatenated, split at offsets when loaded
+        arrays[f"{filename}.path_offsets"] = np.cumsum(
+            [0] + [len(path) for path in paths], dtype=np.int64
+        )
+        arrays[f"{filename}.path_nodes"] = np.concatenate(
+            paths + [np.zeros(0, dtype=np.int64)]
+        )
+    for filename in MAP_PATH_SRCS:
+        arrays[f"{filename}.points"] = parse_path(filename)
+
+    # write uncompressed so that arrays are read without decompression
+    with open(bundle_path, "wb") as f:
+        np.savez(
+            f,
+            version=np.array(MAP_BUNDLE_VERSION),
+            stamps=source_stamps(MAP_GRAPH_SRCS + MAP_PATH_SRCS),
+            **arrays,
+        )
+
+
+@lru_cache(maxsize=None)
+def load_map_bundle(bundle_path: str = MAP_BUNDLE_PATH) -> Optional[dict]:
+    """
+    Memory-map the map bundle at bundle_path, memoizing the result.
+    Returns None if the bundle is missing, from another bundle version or
+    out of date with its source text files, which are only stat-ed:
+    the sizes & modification times they were compiled from must not have changed.
+    """
+    if not os.path.exists(bundle_path):
+        return None
+    bundle = mmap_npz(bundle_path)
+    if (
+        "version" not in bundle
+        or int(bundle["version"]) != MAP_BUNDLE_VERSION
+        or not all(os.path.exists(f) for f in MAP_GRAPH_SRCS + MAP_PATH_SRCS)
+        or not np.array_equal(
+            bundle["stamps"], source_stamps(MAP_GRAPH_SRCS + MAP_PATH_SRCS)
+        )
+    ):
+        return None
+    return bundle
+
+
+def load_graph(filename: str) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Load the given pathfinding graph from the map bundle, parsing its text file if
+    the graph is not in an up to date bundle. Returns the same arrays as parse_graph().
+    """
+    bundle = load_map_bundle()
+    if bundle is None or f"{filename}.nodes" not in bundle:
+        return parse_graph(filename)
+
+    offsets, path_nodes = (
+        bundle[f"{filename}.path_offsets"],
+        bundle[f"{filename}.path_nodes"],
+    )
+    paths = [path_nodes[begin:end] for begin, end in zip(offsets[:-1], offsets[1:])]
+    return bundle[f"{filename}.nodes"], bundle[f"{filename}.connections"], paths
+
+
+def load_path(filename: str) -> np.ndarray:
+    """
+    Load the given obstacle path from the map bundle, parsing its text file if
+    the path is not in an up to date bundle. Returns the same array as parse_path().
+    """
+    bundle = load_map_bundle()
+    if bundle is None or f"{filename}.points" not in bundle:
+        return parse_path(filename)
+    return bundle[f"{filename}.points"]
+
+
+if __name__ == "__main__":
+    compile_map_bundle()
+    print(f"Compiled map bundle: {MAP_BUNDLE_PATH}")
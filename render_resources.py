@@ -0,0 +1,79 @@
+#
+# NP AIG Assignment 1
+# Cached fonts, rendered text & rotated sprites for game rendering
+#
+
+import pygame
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# max no. of rendered text surfaces kept by render_text()
+TEXT_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def get_font(name: str, size: int, bold: bool = False) -> pygame.font.Font:
+    """
+    Get the system font with the given name, size & boldness, creating it only once
+    as pygame.font.SysFont() enumerates the system's fonts on every call.
+    """
+    return pygame.font.SysFont(name, size, bold)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(
+    text: str,
+    color: Tuple[int, int, int],
+    name: str,
+    size: int,
+    bold: bool = False,
+    antialias: bool = True,
+) -> pygame.Surface:
+    """
+    Render the given text in the given colour with the system font described by name,
+    size & bold, reusing the surface rendered for the last TEXT_CACHE_SIZE texts.
+    The returned surface is shared between callers & must not be drawn on.
+    """
+    return get_font(name, size, bold).render(text, antialias, color)
+
+
+# no. of orientations sprites are rotated to, quantizing orientations to 1 degree
+ROTATION_STEPS = 360
+# rotations of each sprite image by quantized orientation, filled in as needed
+rotations: Dict[pygame.Surface, List[Optional[pygame.Surface]]] = {}
+
+
+def quantize_orientation(orientation: float) -> int:
+    """
+    Quantize the given orientation in degrees to one of ROTATION_STEPS steps.
+    """
+    return round(orientation * ROTATION_STEPS / 360) % ROTATION_STEPS
+
+
+def get_rotated(image: pygame.Surface, orientation: float) -> pygame.Surface:
+    """
+    Get the given sprite image rotated to the given orientation in degrees,
+    quantized to ROTATION_STEPS steps. Each rotation is only computed once and
+    unrotated sprites are returned as is.
+    The returned surface is shared between callers & must not be drawn on.
+    """
+    step = quantize_orientation(orientation)
+    if step == 0:
+        return image
+    image_rotations = rotations.setdefault(image, [None] * ROTATION_STEPS)
+    if image_rotations[step] is None:
+        image_rotations[step] = pygame.transform.rotate(
+            image, step * 360 / ROTATION_STEPS
+        )
+    return image_rotations[step]
+
+
+def precompute_rotations(image: pygame.Surface):
+    """
+    Compute the rotations of the given sprite image to every quantized orientation
+    up front, for sprites that are rotated every frame such as projectiles.
+    """
+    if image in rotations and None not in rotations[image]:
+        return
+    for step in range(ROTATION_STEPS):
+        get_rotated(image, step * 360 / ROTATION_STEPS)
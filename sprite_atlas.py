@@ -0,0 +1,144 @@
+#
+# NP AIG Assignment 1
+# Sprite atlas packing the sprites listed in the asset manifest
+#
+
+import os
+import json
+import pygame
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from Globals import ASSET_MANIFEST_PATH, SPRITE_ATLAS_PATH
+from map_bundle import source_stamps
+
+# bumped whenever the layout of the atlas changes, invalidating older atlases
+SPRITE_ATLAS_VERSION = 2
+
+
+def load_manifest(manifest_path: str = ASSET_MANIFEST_PATH) -> List[Dict[str, str]]:
+    """
+    Load the asset manifest, returning its sprites each as a dict with the sprite's
+    name & the path to its image file.
+    """
+    with open(manifest_path, "r") as f:
+        return json.load(f)["sprites"]
+
+
+def pack_rects(sizes: List[Tuple[int, int]]) -> Tuple[List[pygame.Rect], int, int]:
+    """
+    Pack rects of the given (width, height) sizes into shelves of an atlas as wide as
+    the widest rect, tallest first. Returns the packed rects in the given order and
+    the width & height of the atlas.
+    """
+    width = max(w for w, _ in sizes)
+    rects = [None] * len(sizes)
+    shelf_x, shelf_y, shelf_h = 0, 0, 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i]
+        if shelf_x + w > width:
+            # start a new shelf below the current one
+            shelf_x, shelf_y, shelf_h = 0, shelf_y + shelf_h, 0
+        rects[i] = pygame.Rect(shelf_x, shelf_y, w, h)
+        shelf_x, shelf_h = shelf_x + w, max(shelf_h, h)
+    return rects, width, shelf_y + shelf_h
+
+
+def compile_sprite_atlas(atlas_path: str = SPRITE_ATLAS_PATH):
+    """
+    Pack the sprites listed in the asset manifest into an atlas of raw RGBA pixels
+    written to atlas_path.
+    """
+    sprites = load_manifest()
+    sources = [ASSET_MANIFEST_PATH] + [sprite["path"] for sprite in sprites]
+    images = [pygame.image.load(sprite["path"]) for sprite in sprites]
+    rects, width, height = pack_rects([image.get_size() for image in images])
+
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    for image, rect in zip(images, rects):
+        # images without alpha are opaque, as when converted with convert_alpha()
+        rgba = pygame.image.tostring(image, "RGBA")
+        pixels[rect.top : rect.bottom, rect.left : rect.right] = np.frombuffer(
+            rgba, dtype=np.uint8
+        ).reshape(rect.height, rect.width, 4)
+
+    # write uncompressed so that pixels are read without decompression
+    with open(atlas_path, "wb") as f:
+        np.savez(
+            f,
+            version=np.array(SPRITE_ATLAS_VERSION),
+            sources=np.array(sources),
+            stamps=source_stamps(sources),
+            names=np.array([sprite["name"] for sprite in sprites]),
+            rects=np.array([tuple(rect) for rect in rects], dtype=np.int64).reshape(
+                -1, 4
+            ),
+            pixels=pixels,
+        )
+
+
+def load_sprite_atlas(atlas_path: str = SPRITE_ATLAS_PATH) -> Optional[dict]:
+    """
+    Load the sprite atlas at atlas_path.
+    Returns None if the atlas is missing, from another atlas version or
+    out of date with the asset manifest & its image files, which are only stat-ed:
+    the sizes & modification times they were compiled from must not have changed.
+    """
+    if not os.path.exists(atlas_path):
+        return None
+    with np.load(atlas_path) as atlas:
+        if "version" not in atlas or int(atlas["version"]) != SPRITE_ATLAS_VERSION:
+            return None
+        # atlases compiled from another manifest are out of date too
+        sources = [str(path) for path in atlas["sources"]]
+        if (
+            sources[0] != ASSET_MANIFEST_PATH
+            or not all(os.path.exists(path) for path in sources)
+            or not np.array_equal(atlas["stamps"], source_stamps(sources))
+        ):
+            return None
+        return {key: atlas[key] for key in atlas.files}
+
+
+@lru_cache(maxsize=None)
+def load_sprites(converted: bool) -> Dict[str, pygame.Surface]:
+    """
+    Load the sprites listed in the asset manifest by name, memoizing the result so
+    that every game in the process shares the same sprites.
+    Sprites are cut from the sprite atlas, or loaded from their image files if the
+    atlas is missing or out of date. If converted, sprites are converted with
+    convert_alpha() for fast blitting, which needs a display.
+    """
+    atlas = load_sprite_atlas()
+    if atlas is None:
+        sprites = {
+            sprite["name"]: pygame.image.load(sprite["path"])
+            for sprite in load_manifest()
+        }
+        if converted:
+            sprites = {name: sprite.convert_alpha() for name, sprite in sprites.items()}
+        return sprites
+
+    # sprites are cut as copies, so the atlas surface may share the pixels' memory
+    pixels = atlas["pixels"]
+    height, width, _ = pixels.shape
+    atlas_surface = pygame.image.frombuffer(pixels, (width, height), "RGBA")
+    sprites = {}
+    for name, rect in zip(atlas["names"], atlas["rects"].tolist()):
+        sprite = atlas_surface.subsurface(pygame.Rect(*rect))
+        sprites[str(name)] = sprite.convert_alpha() if converted else sprite.copy()
+    return sprites
+
+
+def get_sprite(name: str) -> pygame.Surface:
+    """
+    Get the sprite with the given name in the asset manifest, converted for fast
+    blitting if there is a display to convert for.
+    The sprite is shared between games & must not be drawn on.
+    """
+    return load_sprites(pygame.display.get_surface() is not None)[name]
+
+
+if __name__ == "__main__":
+    compile_sprite_atlas()
+    print(f"Compiled sprite atlas: {SPRITE_ATLAS_PATH}")
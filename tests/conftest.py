@@ -0,0 +1,31 @@
+#
+# NP AIG Assignment 1
+# Fixtures shared by the tests
+#
+
+import os
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+
+@pytest.fixture(scope="session")
+def world():
+    """
+    World created as HAL.py creates it, with its obstacles in place.
+    Shared by the tests: do not modify.
+    """
+    cwd = os.getcwd()
+    os.chdir(ROOT_DIR)
+    try:
+        from HAL import create_world
+
+        pygame.init()
+        return create_world()
+    finally:
+        os.chdir(cwd)
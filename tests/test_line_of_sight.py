@@ -0,0 +1,40 @@
+#
+# NP AIG Assignment 1
+# Tests of line of sight towards graph nodes
+#
+
+import pytest
+from pygame import Vector2
+
+
+def viewer_at(world, position):
+    """
+    Entity at the given position to check line of sight from.
+    """
+    from GameEntity import GameEntity
+
+    viewer = GameEntity(world, "viewer", None)
+    viewer.position = Vector2(position)
+    return viewer
+
+
+@pytest.mark.parametrize("collide_with", [{"obstacle"}, {"obstacle", "base"}])
+def test_obstacles_block_nodes_sharing_their_ids(world, collide_with):
+    """
+    Node ids are not entity ids: an obstacle between an entity & a graph node blocks
+    line of sight even if the node's id is the same as the obstacle's id, whether the
+    ray is cast over the occupancy map or collided with the obstacles' masks.
+    """
+    from Graph import Graph, Node
+    from World_Ext import line_of_sight
+
+    for obstacle in world.obstacles:
+        x, y = obstacle.position
+        reach = obstacle.rect.height / 2 + 60
+        viewer = viewer_at(world, (x, y - reach))
+        graph = Graph(world)
+        same_id = Node(graph, obstacle.id, x, y + reach)
+        other_id = Node(graph, -1, x, y + reach)
+
+        assert not line_of_sight(viewer, other_id, collide_with=collide_with)
+        assert not line_of_sight(viewer, same_id, collide_with=collide_with)
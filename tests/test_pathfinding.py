@@ -0,0 +1,49 @@
+#
+# NP AIG Assignment 1
+# Tests of the paths units take towards their goals
+#
+
+import pytest
+
+
+def path_ids(path):
+    """
+    Get the ids of the nodes joined by each connection of the given path.
+    """
+    return [(c.fromNode.id, c.toNode.id) for c in path]
+
+
+def test_flow_fields_follow_precomputed_routes(world):
+    """
+    Flow fields on the world graph & orc paths, which Orcs, Knight & Wizard follow
+    to their goals, give the same paths as the graphs' precomputed routes.
+    """
+    from Graph import pathFindAStar, pathFindFlowField
+
+    for graph in [world.graph, *world.paths]:
+        nodes = list(graph.nodes.values())
+        for goal in nodes:
+            for start in nodes:
+                assert graph.hasRoute(start, goal) or start.id == goal.id
+                assert path_ids(pathFindFlowField(graph, start, goal)) == path_ids(
+                    pathFindAStar(graph, start, goal)
+                )
+
+
+def test_archer_searches_interpolated_graph_with_astar(world, monkeypatch):
+    """
+    Without hierarchical pathfinding, Team A's Archer searches its interpolated graph
+    with A* even towards its base's goal, where flow fields find cheaper paths.
+    """
+    import Archer_TeamA
+    from Graph import pathFindAStar
+
+    monkeypatch.setattr(Archer_TeamA, "HIERARCHICAL_PATHFINDING", False)
+    archer = next(
+        e for e in world.entities.values() if e.name == "archer" and e.team_id == 0
+    )
+    goal = archer.graph.nodes[archer.base.target_node_index]
+    for start in archer.graph.nodes.values():
+        assert path_ids(Archer_TeamA.find_path(archer, start, goal)) == path_ids(
+            pathFindAStar(archer.graph, start, goal)
+        )